@@ -1,17 +1,36 @@
 import asyncio
 import json
 import sys
-from typing import Dict, List, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+import time
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 import uvicorn
 from datetime import datetime
-import aiohttp
 from pathlib import Path
 
+from bus import WORKER_ID, create_bus
+from circuit_breaker import CircuitBreaker, RetryBudget
+from command_batcher import CommandBatcher
+from config_store import DebouncedJsonWriter
+from dispatcher import DispatchQueue
+from game_state import GameState
+from history import DROPPED, FAILED, NO_COMMANDS, PARTIAL, SUCCESS, SUPERSEDED, EventHistory
+from im_client import IMClient
+from journal import JournalWriter
+import json_codec
+from metrics import metrics
+from scheduling import EventScheduler, PolicyError, validate_policy
+from sessions import PlayerSession, SessionStore
+from settings import load_settings
+from state_publisher import StatePublisher
+from structured_log import get_logger, log_stats, setup_logging
+from triggers import TriggerEngine, TriggerError, compile_trigger
+from ws_broadcast import Broadcaster
+
 
 def get_resource_path(relative_path):
     """获取资源文件的绝对路径，兼容开发环境和 PyInstaller 打包环境"""
@@ -25,6 +44,7 @@ def get_resource_path(relative_path):
 
 
 app = FastAPI(title="CS2 Event Trigger System")
+log = get_logger("app")
 
 # CORS配置
 app.add_middleware(
@@ -37,15 +57,51 @@ app.add_middleware(
 
 # 全局状态
 event_configs: Dict[str, dict] = {}
-current_game_state = {
-    "health": 100,
-    "is_alive": True,
-    "flashed": 0,
-    "smoked": 0,
-    "burning": 0,
-    "round_phase": "unknown",
-    "map_phase": "unknown"
-}
+# 最近一次有变化的玩家的状态（/ws/game-state 推送的内容）
+current_game_state = GameState()
+active_session_id: Optional[str] = None
+
+# GSI 请求统计（processed: 完整处理，skipped: 与上一次内容相同而跳过，ignored: 非本地玩家，
+# dropped: 多进程时没有主 worker 或总线断开而未能转发，triggered: 各事件满足触发条件的次数）
+gsi_stats = {"processed": 0, "skipped": 0, "ignored": 0, "dropped": 0, "triggered": {}}
+
+# 运行参数
+app_settings = load_settings(get_resource_path("settings.json"))
+metrics.enabled = app_settings["metrics"]["enabled"]
+setup_logging(
+    level=app_settings["logging"]["level"],
+    file=str(get_resource_path(app_settings["logging"]["file"])) if app_settings["logging"]["file"] else None,
+    sample_interval=app_settings["logging"]["sample_interval"],
+    sample_burst=app_settings["logging"]["sample_burst"],
+    queue_size=app_settings["logging"]["queue_size"]
+)
+
+# 已编译的触发条件（配置变化时重新编译）
+trigger_engine = TriggerEngine()
+
+# IM 服务客户端（应用生命周期内复用连接）
+im_client = IMClient(
+    app_settings["im"]["url"],
+    pool_size=app_settings["im"]["pool_size"],
+    timeout=app_settings["im"]["timeout"],
+    breaker=CircuitBreaker(
+        failure_threshold=app_settings["im"]["breaker_failures"],
+        reset_timeout=app_settings["im"]["breaker_reset"]
+    ),
+    max_retries=app_settings["im"]["max_retries"],
+    retry_budget=RetryBudget(ratio=app_settings["im"]["retry_ratio"]),
+    probe_interval=app_settings["im"]["probe_interval"],
+    transport=app_settings["im"]["transport"]
+)
+
+# 指令调度（按优先级排队，同一窗口内的指令合并为一次批量请求）
+command_batcher = CommandBatcher(
+    im_client,
+    window=app_settings["im"]["batch_window"],
+    max_batch=app_settings["im"]["max_batch"],
+    enabled=app_settings["im"]["batch"],
+    stale_after=app_settings["im"]["stale_after"]
+)
 
 
 class EventConfig(BaseModel):
@@ -64,8 +120,38 @@ class CommandConfig(BaseModel):
 
 @app.on_event("startup")
 async def startup_event():
+    global leader_task
     # 加载配置
     load_event_configs()
+    apply_event_configs()
+    await im_client.start()
+    command_batcher.start()
+    dispatch_queue.start()
+    state_publisher.start()
+    journal.start()
+    if bus.shared:
+        bus.subscribe("events", on_bus_event)
+        bus.subscribe("state", on_bus_state)
+        bus.subscribe("configs", on_bus_configs)
+        bus.subscribe("history", on_bus_history)
+        bus.subscribe("leader_view", on_bus_leader_view)
+        await bus.start()
+        leader_task = asyncio.create_task(run_leader_election(), name="leader-election")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if leader_task is not None:
+        leader_task.cancel()
+        await asyncio.gather(leader_task, return_exceptions=True)
+    await bus.close()
+    await config_writer.flush()
+    await state_publisher.stop()
+    await dispatch_queue.stop()
+    await command_batcher.stop()
+    await im_client.close()
+    # 等待后台线程写完剩余的记录
+    await asyncio.get_running_loop().run_in_executor(None, journal.close)
 
 
 def load_event_configs():
@@ -81,9 +167,12 @@ def load_event_configs():
             "player_hurt": {
                 "event_name": "玩家受伤",
                 "enabled": True,
+                "priority": 50,
                 "trigger_condition": {
                     "type": "health_decrease",
-                    "min_damage": 1
+                    "min_damage": 1,
+                    "max_rate": 5,
+                    "burst": 3
                 },
                 "actions": [
                     {
@@ -99,6 +188,7 @@ def load_event_configs():
             "player_death": {
                 "event_name": "玩家死亡",
                 "enabled": True,
+                "priority": 100,
                 "trigger_condition": {
                     "type": "health_zero"
                 },
@@ -114,6 +204,7 @@ def load_event_configs():
             "player_flashed": {
                 "event_name": "闪光弹致盲",
                 "enabled": True,
+                "priority": 20,
                 "trigger_condition": {
                     "type": "flashed",
                     "min_value": 1
@@ -130,6 +221,7 @@ def load_event_configs():
             "player_smoked": {
                 "event_name": "烟雾弹影响",
                 "enabled": True,
+                "priority": 10,
                 "trigger_condition": {
                     "type": "smoked",
                     "min_value": 1
@@ -146,9 +238,11 @@ def load_event_configs():
             "player_burning": {
                 "event_name": "燃烧伤害",
                 "enabled": True,
+                "priority": 10,
                 "trigger_condition": {
                     "type": "burning",
-                    "min_value": 1
+                    "min_value": 1,
+                    "cooldown": 1.0
                 },
                 "actions": [
                     {
@@ -162,6 +256,7 @@ def load_event_configs():
             "round_end": {
                 "event_name": "回合结束",
                 "enabled": True,
+                "priority": 80,
                 "trigger_condition": {
                     "type": "round_phase",
                     "value": "over"
@@ -179,11 +274,27 @@ def load_event_configs():
         save_event_configs()
 
 
+def apply_event_configs():
+    """配置变化后重新编译触发条件并更新频率控制策略"""
+    trigger_engine.compile(event_configs)
+    for event_id, error in trigger_engine.errors.items():
+        log.warning("✗ 事件触发条件无效，已忽略", event_id=event_id, error=error)
+    for session in sessions:
+        session.scheduler.configure(event_configs)
+
+
 def save_event_configs():
-    """保存事件配置到文件"""
-    config_path = get_resource_path("event_configs.json")
-    with open(config_path, "w", encoding="utf-8") as f:
-        json.dump(event_configs, f, ensure_ascii=False, indent=2)
+    """保存事件配置到文件（合并短时间内的多次修改，在后台原子写入），多进程时通知其他 worker"""
+    config_writer.schedule()
+    if bus.shared:
+        bus.publish_nowait("configs", [WORKER_ID, event_configs])
+
+
+config_writer = DebouncedJsonWriter(
+    get_resource_path("event_configs.json"),
+    lambda: event_configs,
+    delay=app_settings["config_store"]["save_delay"]
+)
 
 
 @app.get("/api/events")
@@ -200,10 +311,25 @@ async def get_event(event_id: str):
     return {"error": "Event not found"}, 404
 
 
+def validate_event_config(config: dict):
+    """保存前编译一次触发条件并检查频率控制参数和优先级，无效时返回 400"""
+    trigger = config.get("trigger_condition") or {}
+    try:
+        compile_trigger(trigger)
+        validate_policy(trigger)
+    except (TriggerError, PolicyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    priority = config.get("priority", 0)
+    if isinstance(priority, bool) or not isinstance(priority, int) or not 0 <= priority <= 100:
+        raise HTTPException(status_code=400, detail="priority 必须是 0-100 的整数")
+
+
 @app.post("/api/events/{event_id}")
 async def update_event(event_id: str, config: dict):
     """更新事件配置"""
+    validate_event_config(config)
     event_configs[event_id] = config
+    apply_event_configs()
     save_event_configs()
     return {"success": True, "event": config}
 
@@ -213,6 +339,7 @@ async def delete_event(event_id: str):
     """删除事件配置"""
     if event_id in event_configs:
         del event_configs[event_id]
+        apply_event_configs()
         save_event_configs()
         return {"success": True}
     return {"error": "Event not found"}, 404
@@ -221,217 +348,565 @@ async def delete_event(event_id: str):
 @app.post("/api/events")
 async def create_event(config: dict):
     """创建新事件配置"""
+    validate_event_config(config)
     event_id = config.get("event_id", f"custom_{len(event_configs)}")
     event_configs[event_id] = config
+    apply_event_configs()
     save_event_configs()
     return {"success": True, "event_id": event_id, "event": config}
 
 
-@app.get("/api/game-state")
-async def get_game_state():
-    """获取当前游戏状态"""
-    return current_game_state
+@app.get("/api/history")
+async def get_history(cursor: Optional[int] = None, since: Optional[float] = None,
+                      event_id: Optional[str] = None, limit: int = 100):
+    """已触发事件的历史，按序号从旧到新排列
 
+    cursor: 上一页返回的 next_cursor，只返回之后的事件；since: 时间戳（秒）；
+    两者都不指定时返回最新的 limit 条
+    """
+    events, page = event_history.query(cursor=cursor, since=since, event_id=event_id, limit=limit)
+    return {"events": events, **page}
 
 
+@app.get("/api/gsi-stats")
+async def get_gsi_stats():
+    """获取 GSI 请求处理统计（多进程时由主 worker 统计，其他 worker 返回主 worker 最近同步的数据）
 
-@app.post("/api/cs2-event")
-async def handle_cs2_event(data: dict):
-    """处理CS2游戏状态更新"""
-    global current_game_state
+    dropped 在转发前统计，多进程时只反映处理该请求的 worker
+    """
+    if not is_leader and leader_view is not None:
+        return {**leader_view["gsi_stats"], "dropped": gsi_stats["dropped"]}
+    return gsi_stats
+
+
+@app.get("/api/game-state")
+async def get_game_state(steamid: Optional[str] = None):
+    """获取当前游戏状态，指定 steamid 时返回该玩家的状态"""
+    if steamid is None:
+        return current_game_state.to_dict()
+    session = sessions.find(steamid)
+    if session is None:
+        raise HTTPException(status_code=404, detail="玩家不存在")
+    return session.state.to_dict()
+
+
+@app.get("/api/sessions")
+async def get_sessions():
+    """正在发送 GSI 数据的玩家（按最近活动排序；多进程时与 /api/gsi-stats 相同，来自主 worker）"""
+    if not is_leader and leader_view is not None:
+        return leader_view["sessions"]
+    return sessions_view()
+
+
+def sessions_view() -> dict:
+    sessions.sweep()
+    now = time.monotonic()
+    return {
+        "active_session": active_session_id,
+        "sessions": [session.to_dict(now) for session in sessions],
+    }
 
-    try:
-        if "player" not in data or "map" not in data:
-            return {"status": "error", "message": "Invalid data format"}
-
-        # 检查是否是本地玩家
-        if data["provider"]["steamid"] != data["player"]["steamid"]:
-            return {"status": "ignored", "message": "Not local player"}
-
-        # 更新游戏状态
-        player_state = data["player"]["state"]
-        new_health = player_state["health"]
-        new_flashed = player_state.get("flashed", 0)
-        new_smoked = player_state.get("smoked", 0)
-        new_burning = player_state.get("burning", 0)
-
-        # 检查并触发事件
-        await check_and_trigger_events(
-            old_state=current_game_state,
-            new_state={
-                "health": new_health,
-                "is_alive": new_health > 0,
-                "flashed": new_flashed,
-                "smoked": new_smoked,
-                "burning": new_burning,
-                "round_phase": data.get("round", {}).get("phase", "unknown"),
-                "map_phase": data.get("map", {}).get("phase", "unknown")
-            }
-        )
 
-        # 更新当前状态
-        current_game_state.update({
-            "health": new_health,
-            "is_alive": new_health > 0,
-            "flashed": new_flashed,
-            "smoked": new_smoked,
-            "burning": new_burning,
-            "round_phase": data.get("round", {}).get("phase", "unknown"),
-            "map_phase": data.get("map", {}).get("phase", "unknown")
-        })
 
-        return {"status": "success", "message": "Event processed"}
 
+def gsi_response(payload: dict) -> Response:
+    """GSI 接口的响应，直接编码避免 FastAPI 的通用序列化"""
+    return Response(content=json_codec.dumps_bytes(payload), media_type="application/json")
+
+
+@app.post("/api/cs2-event")
+async def handle_cs2_event(request: Request):
+    """处理CS2游戏状态更新（读取原始请求体，只提取需要的字段）"""
+    try:
+        body = await request.body()
+        received_at = time.perf_counter()
+        data = json_codec.loads(body)
+        parsed_at = time.perf_counter()
+        metrics.observe("parse", parsed_at - received_at)
+        if not isinstance(data, dict) or "map" not in data:
+            return gsi_response({"status": "error", "message": "Invalid data format"})
+        provider = data.get("provider")
+        player = data.get("player")
+        if not isinstance(provider, dict) or not isinstance(player, dict) or "steamid" not in provider:
+            return gsi_response({"status": "error", "message": "Invalid data format"})
+
+        # 按数据来源（provider 的 SteamID）区分会话；观战时 player 是被观战的玩家
+        provider_id = provider["steamid"]
+        player_id = player.get("steamid")
+        if player_id == provider_id:
+            session_id = provider_id
+        elif track_observed_players and player_id:
+            session_id = f"{provider_id}/{player_id}"
+        else:
+            gsi_stats["ignored"] += 1
+            return gsi_response({"status": "ignored", "message": "Not local player"})
+
+        fingerprint = GameState.fingerprint(data)
+        if bus.shared:
+            # 多进程时只解析，由主 worker 按到达顺序处理状态和触发；
+            # 没有主 worker 订阅或总线断开时消息会丢失，如实告知而不是返回 Queued
+            if not leader_available():
+                gsi_stats["dropped"] += 1
+                return gsi_response({"status": "error", "message": "No leader"})
+            if not await bus.publish("ticks", [session_id, fingerprint]):
+                gsi_stats["dropped"] += 1
+                return gsi_response({"status": "error", "message": "Bus unavailable"})
+            return gsi_response({"status": "success", "message": "Queued"})
+        return gsi_response(process_tick(session_id, fingerprint, received_at, parsed_at))
+
+    except Exception as e:
+        log.error("处理 CS2 事件失败", error=e)
+        return gsi_response({"status": "error", "message": str(e)})
+
+
+def process_tick(session_id: str, fingerprint: tuple, received_at: float = 0.0,
+                 parsed_at: float = 0.0) -> dict:
+    """更新玩家状态并检查触发条件"""
+    global current_game_state, active_session_id
+
+    session = sessions.get(session_id)
+
+    # 相关字段与上一次完全相同（心跳或无关字段变化）时跳过状态重建
+    if fingerprint == session.fingerprint:
+        gsi_stats["skipped"] += 1
+        # 持续型触发条件（如燃烧）仍需每个 tick 检查
+        if trigger_engine.has_level_triggers:
+            check_and_trigger_events(session, session.state, session.state, (), received_at)
+        return {"status": "success", "message": "Unchanged"}
+
+    # 构建本 tick 的状态快照
+    old_state = session.state
+    new_state = GameState(*fingerprint)
+    first_tick = session.fingerprint is None
+    session.fingerprint = fingerprint
+    gsi_stats["processed"] += 1
+    if journal.enabled:
+        journal.append_state(session_id, fingerprint)
+
+    # 检查事件，匹配到的动作交给后台队列执行
+    changed = new_state.diff(old_state)
+    diffed_at = time.perf_counter()
+    if parsed_at:
+        metrics.observe("diff", diffed_at - parsed_at)
+    if first_tick:
+        # 新会话的第一个 tick 只作为基线（中途接入时已有的击杀、MVP 等不算新事件），只检查持续型条件
+        check_and_trigger_events(session, new_state, new_state, (), received_at)
+    else:
+        check_and_trigger_events(session, old_state, new_state, changed, received_at)
+    metrics.observe("trigger", time.perf_counter() - diffed_at)
+
+    # 整体替换会话状态；有变化（或切换到另一个玩家）时推送
+    session.state = new_state
+    if changed or session_id != active_session_id:
+        current_game_state = new_state
+        active_session_id = session_id
+        state_publisher.notify()
+        if bus.shared:
+            bus.publish_nowait("state", [WORKER_ID, session_id, fingerprint])
+
+    return {"status": "success", "message": "Event processed"}
+
+
+def check_and_trigger_events(session: PlayerSession, old_state: GameState, new_state: GameState,
+                             changed: Tuple[str, ...], received_at: float = 0.0):
+    """检查触发条件，把符合条件的事件放入分发队列"""
+    triggered = gsi_stats["triggered"]
+    for event_id, config in trigger_engine.evaluate(old_state, new_state, changed):
+        triggered[event_id] = triggered.get(event_id, 0) + 1
+        log.debug("触发事件", event_id=event_id, session=session.session_id)
+        # 经过该玩家的频率控制后由后台 worker 发送指令并通知前端
+        session.scheduler.offer(
+            event_id, (session.session_id, event_id, config, old_state, new_state, received_at))
+
+
+def enqueue_event(event_id: str, job: tuple):
+    """把通过频率控制的事件放入分发队列（同一玩家的同一事件可合并）"""
+    if not dispatch_queue.submit(job, key=(job[0], event_id)):
+        log.warning("✗ 分发队列已满，丢弃事件", event_id=event_id, session=job[0])
+
+
+async def dispatch_event(job: tuple):
+    """分发队列 worker：执行事件动作、写入事件历史并通知前端"""
+    session_id, event_id, config, old_state, new_state, received_at = job
+    changes = {field: [getattr(old_state, field), getattr(new_state, field)]
+               for field in new_state.diff(old_state)}
+    timestamp = time.time()
+    seq = event_history.record(event_id, session_id, changes, timestamp)
+    if bus.shared:
+        bus.publish_nowait("history", [WORKER_ID, event_history.history_id, "record",
+                                       [seq, timestamp, event_id, session_id, changes]])
+    actions = config.get("actions", [])
+    if journal.enabled:
+        journal.append_event(seq, session_id, event_id,
+                             [a.get("command", "") for a in actions if a.get("type") == "send_command"])
+    try:
+        futures = execute_event_actions(actions, old_state, new_state,
+                                        config.get("priority", 0), received_at, session_id)
     except Exception as e:
-        print(f"Error processing CS2 event: {e}")
-        return {"status": "error", "message": str(e)}
+        # 动作执行失败（如配置文件中的参数无效）时也要结束这条历史记录，避免一直处于 pending
+        log.error("✗ 执行事件动作失败", event_id=event_id, error=e)
+        complete_event(seq, FAILED)
+    else:
+        record_outcome(seq, futures, received_at)
+    # 通知前端发生了事件
+    notify_frontend_event(event_id, {
+        "old_state": old_state.to_dict(),
+        "new_state": new_state.to_dict()
+    }, session_id, seq)
+
+
+def record_outcome(seq: int, futures: List[asyncio.Future], received_at: float = 0.0):
+    """事件的指令全部完成后把发送结果和耗时写入事件历史和对局日志"""
+    if not futures:
+        complete_event(seq, NO_COMMANDS)
+        return
+    started_at = received_at or time.perf_counter()
+
+    def complete(gathered: asyncio.Future):
+        results = [result if isinstance(result, dict) else {} for result in gathered.result()]
+        # 被调度器丢弃（取代或抢占）的指令没有发送，不计入成功或失败
+        sent = [result for result in results if not result.get("dropped")]
+        if not sent:
+            superseded = all(result.get("reason") == "superseded" for result in results)
+            outcome = SUPERSEDED if superseded else DROPPED
+        else:
+            succeeded = sum(1 for result in sent if result.get("success"))
+            if succeeded == len(sent):
+                outcome = SUCCESS
+            else:
+                outcome = PARTIAL if succeeded else FAILED
+        complete_event(seq, outcome, time.perf_counter() - started_at)
+
+    asyncio.gather(*futures, return_exceptions=True).add_done_callback(complete)
+
+
+def complete_event(seq: int, outcome: str, latency: Optional[float] = None):
+    event_history.complete(seq, outcome, latency)
+    if bus.shared:
+        bus.publish_nowait("history", [WORKER_ID, event_history.history_id, "complete",
+                                       [seq, outcome, latency]])
+    if journal.enabled:
+        journal.append_outcome(seq, outcome, latency)
+
+
+# 已触发事件的历史（固定容量，供前端重连后补齐）
+event_history = EventHistory(app_settings["history"]["capacity"])
+
+# 对局日志（默认关闭）
+journal = JournalWriter(
+    get_resource_path(app_settings["journal"]["dir"]),
+    enabled=app_settings["journal"]["enabled"],
+    max_bytes=app_settings["journal"]["max_bytes"],
+    max_age=app_settings["journal"]["max_age"],
+    max_segments=app_settings["journal"]["max_segments"],
+    queue_size=app_settings["journal"]["queue_size"],
+    flush_interval=app_settings["journal"]["flush_interval"]
+)
 
+state_publisher = StatePublisher(
+    lambda: current_game_state.to_dict(),
+    min_interval=app_settings["state_push"]["min_interval"],
+    heartbeat=app_settings["state_push"]["heartbeat"]
+)
 
-async def check_and_trigger_events(old_state: dict, new_state: dict):
-    """检查并触发符合条件的事件"""
-    for event_id, config in event_configs.items():
-        if not config.get("enabled", False):
-            continue
+def create_event_scheduler() -> EventScheduler:
+    scheduler = EventScheduler(enqueue_event)
+    scheduler.configure(event_configs)
+    return scheduler
 
-        trigger = config.get("trigger_condition", {})
-        trigger_type = trigger.get("type")
 
-        # 检查触发条件
-        should_trigger = False
+# 每个玩家独立的状态与频率控制
+sessions = SessionStore(
+    create_event_scheduler,
+    max_sessions=app_settings["sessions"]["max_sessions"],
+    idle_timeout=app_settings["sessions"]["idle_timeout"]
+)
+track_observed_players = app_settings["sessions"]["track_observed_players"]
+
+# 多进程模式的消息总线（未配置时为进程内总线，所有处理都在本进程完成）
+bus = create_bus(app_settings["cluster"]["bus"])
+# 单进程时本进程就是事件历史的来源；多进程时非主 worker 收到主 worker 的同步后才有完整的历史
+event_history.synced = not bus.shared
+# 多进程时只有主 worker 处理状态和触发（保证同一玩家的数据按顺序处理、频率控制不被拆分）
+is_leader = not bus.shared
+leader_task: Optional[asyncio.Task] = None
+LEADER_TTL = 3.0
+# 主 worker 定期同步的玩家会话和 GSI 统计，供其他 worker 的 /api/sessions、/api/gsi-stats 返回
+leader_view: Optional[dict] = None
+# 最近一次收到主 worker 同步的时间（time.monotonic）
+leader_seen_at = 0.0
+
+
+def leader_available() -> bool:
+    """是否有主 worker 在处理转发的 GSI 数据：本进程就是主 worker，或一个锁周期内收到过主 worker 的同步"""
+    return is_leader or time.monotonic() - leader_seen_at < LEADER_TTL
+
+
+async def run_leader_election():
+    """定期获取或续期主 worker 锁，成为主 worker 后开始处理各 worker 转发的 GSI 数据"""
+    global is_leader
+    while True:
+        try:
+            leader = await bus.acquire_lock("leader", WORKER_ID, LEADER_TTL)
+        except Exception as e:
+            log.warning("✗ 选主失败", error=e)
+            leader = False
+        if leader != is_leader:
+            is_leader = leader
+            if leader:
+                bus.subscribe("ticks", on_bus_tick)
+                log.info("成为主 worker，开始处理游戏数据", worker=WORKER_ID)
+            else:
+                bus.unsubscribe("ticks", on_bus_tick)
+                log.warning("失去主 worker 身份", worker=WORKER_ID)
+        if is_leader:
+            bus.publish_nowait("leader_view", [WORKER_ID, {"gsi_stats": gsi_stats,
+                                                            "sessions": sessions_view()}])
+        await asyncio.sleep(LEADER_TTL / 3)
+
+
+def on_bus_tick(message: list):
+    session_id, fingerprint = message
+    process_tick(session_id, tuple(fingerprint))
+
+
+def on_bus_state(message: list):
+    """其他 worker 的状态变化，更新本进程 /ws/game-state 推送的内容"""
+    global current_game_state, active_session_id
+    origin, session_id, fingerprint = message
+    if origin == WORKER_ID:
+        return
+    current_game_state = GameState(*fingerprint)
+    active_session_id = session_id
+    state_publisher.notify()
 
-        if trigger_type == "health_decrease":
-            if new_state["health"] < old_state["health"]:
-                min_damage = trigger.get("min_damage", 1)
-                if old_state["health"] - new_state["health"] >= min_damage:
-                    should_trigger = True
 
-        elif trigger_type == "health_zero":
-            if new_state["health"] == 0 and old_state["health"] > 0:
-                should_trigger = True
+def on_bus_event(message: list):
+    event_id, frame = message
+    broadcast_game_event(event_id, frame)
 
-        elif trigger_type == "flashed":
-            if new_state["flashed"] > 0 and old_state["flashed"] == 0:
-                should_trigger = True
 
-        elif trigger_type == "smoked":
-            if new_state["smoked"] > 0 and old_state["smoked"] == 0:
-                should_trigger = True
+def on_bus_history(message: list):
+    """主 worker 记录的事件历史，写入本进程的缓冲区"""
+    origin, history_id, kind, entry = message
+    if origin == WORKER_ID:
+        return
+    event_history.adopt(history_id)
+    if kind == "record":
+        event_history.insert(*entry)
+    else:
+        event_history.complete(*entry)
 
-        elif trigger_type == "burning":
-            if new_state["burning"] > 0:
-                should_trigger = True
 
-        elif trigger_type == "round_phase":
-            target_phase = trigger.get("value")
-            if new_state["round_phase"] == target_phase and old_state["round_phase"] != target_phase:
-                should_trigger = True
+def on_bus_leader_view(message: list):
+    global leader_view, leader_seen_at
+    origin, view = message
+    if origin != WORKER_ID:
+        leader_view = view
+        leader_seen_at = time.monotonic()
 
-        # 触发事件动作 - 通知前端
-        if should_trigger:
-            await execute_event_actions(config.get("actions", []), old_state, new_state)
-            # 通知前端发生了事件
-            await notify_frontend_event(event_id, {
-                "old_state": old_state,
-                "new_state": new_state
-            })
 
+def on_bus_configs(message: list):
+    """其他 worker 修改了事件配置"""
+    global event_configs
+    origin, configs = message
+    if origin == WORKER_ID:
+        return
+    event_configs = configs
+    apply_event_configs()
+
+dispatch_queue = DispatchQueue(
+    dispatch_event,
+    maxsize=app_settings["dispatch"]["queue_size"],
+    workers=app_settings["dispatch"]["workers"],
+    overflow_policy=app_settings["dispatch"]["overflow_policy"]
+)
 
-async def execute_event_actions(actions: List[dict], old_state: dict, new_state: dict):
-    """执行事件动作 - 调用 Node.js IM 服务发送指令"""
+
+def execute_event_actions(actions: List[dict], old_state: GameState, new_state: GameState,
+                          priority: int = 0, received_at: float = 0.0,
+                          session_id: Optional[str] = None) -> List[asyncio.Future]:
+    """执行事件动作 - 把指令按事件优先级交给指令调度器，由其调用 Node.js IM 服务"""
+    results = []
     for action in actions:
         action_type = action.get("type")
 
         if action_type == "send_command":
             # 获取指令内容
             command_id = action.get("command", "")
+            future = command_batcher.submit(command_id, priority, session_id)
+            if metrics.enabled and received_at:
+                future.add_done_callback(_end_to_end_recorder(received_at))
+            results.append(future)
+    return results
+
+
+def _end_to_end_recorder(received_at: float):
+    """指令被 IM 服务确认时记录从收到 GSI 请求开始的总耗时"""
+    def record(future: asyncio.Future):
+        if not future.cancelled() and future.result().get("success"):
+            metrics.observe("end_to_end", time.perf_counter() - received_at)
+    return record
+
 
-            # 调用 Node.js IM 服务发送指令
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        'http://localhost:3001/api/send-command',
-                        json={'commandId': command_id},
-                        timeout=aiohttp.ClientTimeout(total=5)
-                    ) as response:
-                        result = await response.json()
-                        if result.get('success'):
-                            print(f"✓ 指令发送成功: {command_id}")
-                        else:
-                            print(f"✗ 指令发送失败: {command_id} - {result.get('message')}")
-            except Exception as e:
-                print(f"✗ 调用 IM 服务失败: {e}")
-
-
-async def notify_frontend_event(event_id: str, event_data: dict = None):
-    """通知前端发生了游戏事件"""
-    if not game_event_connections:
+def notify_frontend_event(event_id: str, event_data: dict = None, session_id: Optional[str] = None,
+                          seq: Optional[int] = None):
+    """通知前端发生了游戏事件（编码一次后放入各连接的发送队列；多进程时经总线发给每个 worker）
+
+    seq 为事件历史中的序号，前端重连后可用它作为 /api/history 的游标补齐错过的事件
+    """
+    if not game_event_broadcaster and not bus.shared:
         return
 
-    message_data = {
+    message = json_codec.dumps({
         "type": "game_event",
         "event_id": event_id,
+        "seq": seq,
+        "history_id": event_history.history_id,
+        "steamid": session_id,
         "data": event_data or {},
         "timestamp": datetime.now().isoformat()
-    }
+    })
+    if bus.shared:
+        bus.publish_nowait("events", [event_id, message])
+    else:
+        broadcast_game_event(event_id, message)
 
-    # 向所有连接的前端发送事件通知
-    disconnected = []
-    for ws in game_event_connections:
-        try:
-            await ws.send_json(message_data)
-            print(f"✓ 已通知前端事件: {event_id}")
-        except Exception as e:
-            print(f"发送事件通知失败: {e}")
-            disconnected.append(ws)
 
-    # 清理断开的连接
-    for ws in disconnected:
-        if ws in game_event_connections:
-            game_event_connections.remove(ws)
+def broadcast_game_event(event_id: str, message: str):
+    """把编码好的事件通知推送给本进程的 WebSocket 连接"""
+    if not game_event_broadcaster:
+        return
+    started_at = time.perf_counter()
+    delivered = game_event_broadcaster.broadcast(message)
+    metrics.observe("ws_fanout", time.perf_counter() - started_at)
+    log.info("✓ 已通知前端事件", event_id=event_id, connections=delivered)
 
 
 @app.websocket("/ws/game-state")
 async def websocket_game_state(websocket: WebSocket):
-    """WebSocket连接，实时推送游戏状态"""
+    """WebSocket连接，状态变化时推送游戏状态
+
+    ?protocol=delta 使用增量协议（见 state_publisher.py），否则每次推送完整状态
+    """
     await websocket.accept()
+    if websocket.query_params.get("protocol") == "delta":
+        await serve_state_deltas(websocket)
+        return
+
     try:
+        version, frame = state_publisher.version, state_publisher.frame
         while True:
-            await websocket.send_json({
-                "type": "game_state",
-                "data": current_game_state,
-                "timestamp": datetime.now().isoformat()
-            })
-            await asyncio.sleep(0.5)
+            await websocket.send_text(frame)
+            version, frame = await state_publisher.next_frame(version)
     except WebSocketDisconnect:
-        print("WebSocket disconnected")
+        log.info("游戏状态 WebSocket 断开")
+
+
+async def serve_state_deltas(websocket: WebSocket):
+    """增量协议：先发快照，之后发送带序号的字段增量，收到 resync 时重发快照"""
+    resync = asyncio.Event()
+    closed = False
+
+    async def receive_messages():
+        nonlocal closed
+        try:
+            while True:
+                message = await websocket.receive_text()
+                if message == "resync" or '"resync"' in message:
+                    resync.set()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            closed = True
+            resync.set()
+
+    receiver = asyncio.create_task(receive_messages())
+    try:
+        seq = state_publisher.version
+        await websocket.send_text(state_publisher.snapshot_frame)
+        while True:
+            await state_publisher.wait(seq, resync)
+            if closed:
+                break
+
+            version = state_publisher.version
+            if resync.is_set():
+                resync.clear()
+                frame = state_publisher.snapshot_frame
+            elif version == seq:
+                frame = state_publisher.heartbeat_frame
+            elif version == seq + 1:
+                frame = state_publisher.delta_frame
+            else:
+                # 跳过了中间版本，直接发送快照
+                frame = state_publisher.snapshot_frame
+            seq = version
+            await websocket.send_text(frame)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
 
 
 # 游戏事件 WebSocket 连接管理
-game_event_connections: List[WebSocket] = []
+game_event_broadcaster = Broadcaster(queue_size=app_settings["ws"]["client_queue_size"])
 
 
 @app.websocket("/ws/game-events")
 async def websocket_game_events(websocket: WebSocket):
     """WebSocket连接，实时推送游戏事件到前端"""
     await websocket.accept()
-    game_event_connections.append(websocket)
-    print(f"前端已连接 WebSocket，当前连接数: {len(game_event_connections)}")
+    subscriber = game_event_broadcaster.add(websocket)
+    log.info("前端已连接 WebSocket", connections=len(game_event_broadcaster))
 
     try:
         while True:
             # 保持连接，接收前端的心跳消息
             data = await websocket.receive_text()
             if data == "ping":
-                await websocket.send_text("pong")
+                game_event_broadcaster.send(subscriber, "pong")
     except WebSocketDisconnect:
-        game_event_connections.remove(websocket)
-        print(f"前端断开 WebSocket，当前连接数: {len(game_event_connections)}")
+        pass
+    finally:
+        game_event_broadcaster.remove(subscriber)
+        log.info("前端断开 WebSocket", connections=len(game_event_broadcaster))
+
+
+@app.get("/api/metrics")
+async def get_metrics(format: str = "json"):
+    """各处理阶段的延迟统计，format=prometheus 时返回 Prometheus 文本格式"""
+    if format == "prometheus":
+        return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+    return metrics.to_dict()
+
+
+@app.delete("/api/metrics")
+async def reset_metrics():
+    """清空延迟统计（基准测试开始前调用）"""
+    metrics.reset()
+    return {"success": True}
 
 
 @app.get("/api/health")
 async def health_check():
     """健康检查接口"""
-    return {"status": "ok", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "ok",
+        "timestamp": datetime.now().isoformat(),
+        "im_service": im_client.health(),
+        "im_client": im_client.stats(),
+        "im_commands": command_batcher.stats(),
+        "dispatch": dispatch_queue.stats(),
+        "game_events_ws": game_event_broadcaster.stats(),
+        "sessions": sessions.stats(),
+        "cluster": {"worker": WORKER_ID, "leader": is_leader, "bus": bus.stats()},
+        "event_scheduling": sessions.scheduler_stats(),
+        "trigger_errors": trigger_engine.errors,
+        "history": event_history.stats(),
+        "journal": journal.stats(),
+        "logging": log_stats()
+    }
 
 
 # 前端静态文件服务
@@ -0,0 +1,141 @@
+"""
+JSON 编解码微基准
+对比 GSI 接口旧路径（标准库 json + FastAPI/pydantic dict 校验）与新路径（json_codec + 只提取需要的字段），
+相邻两个 tick 的状态比较开销，以及 WebSocket 帧的编码开销
+
+用法:
+    python bench_codec.py                    # 使用内置示例数据
+    python bench_codec.py -i recorded.jsonl  # 使用录制的 GSI 数据（test_cs2_connect.py --record 的输出，或每行一个请求体）
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import Callable, List
+
+from pydantic import TypeAdapter
+
+import json_codec
+from game_state import GameState
+from replay_gsi import read_records
+
+
+def sample_payload() -> dict:
+    """带武器和比赛统计的典型 GSI 请求体"""
+    return {
+        "provider": {"name": "Counter-Strike: Global Offensive", "appid": 730, "version": 14000,
+                     "steamid": "76561198000000000", "timestamp": 1700000000},
+        "map": {"mode": "competitive", "name": "de_mirage", "phase": "live", "round": 7,
+                "team_ct": {"score": 4, "consecutive_round_losses": 0, "timeouts_remaining": 1,
+                            "matches_won_this_series": 0},
+                "team_t": {"score": 3, "consecutive_round_losses": 1, "timeouts_remaining": 1,
+                           "matches_won_this_series": 0},
+                "num_matches_to_win_series": 0},
+        "round": {"phase": "live"},
+        "player": {
+            "steamid": "76561198000000000", "name": "玩家", "observer_slot": 1, "team": "CT",
+            "activity": "playing",
+            "state": {"health": 87, "armor": 100, "helmet": True, "flashed": 0, "smoked": 0,
+                      "burning": 0, "money": 3250, "round_kills": 1, "round_killhs": 1,
+                      "equip_value": 5200},
+            "weapons": {
+                "weapon_0": {"name": "weapon_knife", "paintkit": "default", "type": "Knife",
+                             "state": "holstered"},
+                "weapon_1": {"name": "weapon_usp_silencer", "paintkit": "default", "type": "Pistol",
+                             "ammo_clip": 12, "ammo_clip_max": 12, "ammo_reserve": 24,
+                             "state": "holstered"},
+                "weapon_2": {"name": "weapon_m4a1_silencer", "paintkit": "default", "type": "Rifle",
+                             "ammo_clip": 17, "ammo_clip_max": 20, "ammo_reserve": 80,
+                             "state": "active"},
+                "weapon_3": {"name": "weapon_flashbang", "paintkit": "default", "type": "Grenade",
+                             "ammo_reserve": 1, "state": "holstered"},
+            },
+            "match_stats": {"kills": 6, "assists": 2, "deaths": 3, "mvps": 1, "score": 15},
+        },
+    }
+
+
+def load_payloads(path: str) -> List[bytes]:
+    return [body for _, body in read_records(path)]
+
+
+def measure(name: str, func: Callable, items: list, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            func(item)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / (rounds * len(items)) * 1e6
+    print(f"  {name:<38} {per_call:8.2f} µs/次")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 编解码微基准")
+    parser.add_argument("-i", "--input", help="录制的 GSI 数据文件（JSON Lines，可为 .gz）")
+    parser.add_argument("-n", "--rounds", type=int, default=2000, help="总调用次数（按样本数平分）")
+    args = parser.parse_args()
+
+    if args.input:
+        payloads = load_payloads(args.input)
+    else:
+        payloads = [json.dumps(sample_payload()).encode("utf-8")]
+    rounds = max(1, args.rounds // len(payloads))
+
+    dict_adapter = TypeAdapter(dict)
+
+    def ingest_stdlib(body: bytes):
+        data = dict_adapter.validate_python(json.loads(body))
+        player_state = data["player"]["state"]
+        return {
+            "health": player_state["health"],
+            "is_alive": player_state["health"] > 0,
+            "flashed": player_state.get("flashed", 0),
+            "smoked": player_state.get("smoked", 0),
+            "burning": player_state.get("burning", 0),
+            "round_phase": data.get("round", {}).get("phase", "unknown"),
+            "map_phase": data.get("map", {}).get("phase", "unknown"),
+        }
+
+    def ingest_fast(body: bytes):
+        return GameState.from_payload(json_codec.loads(body))
+
+    states = [ingest_fast(body).to_dict() for body in payloads]
+    frames = [{"type": "game_state", "data": state, "timestamp": datetime.now().isoformat()}
+              for state in states]
+
+    print(f"编解码后端: {json_codec.BACKEND}，样本数: {len(payloads)}，"
+          f"平均大小: {sum(map(len, payloads)) // len(payloads)} 字节")
+    print("GSI 请求解析:")
+    old = measure("json.loads + pydantic dict 校验", ingest_stdlib, payloads, rounds)
+    new = measure(f"{json_codec.BACKEND}.loads + GameState", ingest_fast, payloads, rounds)
+    print(f"  加速比: {old / new:.2f}x")
+
+    # 相邻 tick 的状态对；只有一个样本时构造一次受伤、一次击杀和一次换弹
+    snapshots = [ingest_fast(body) for body in payloads]
+    if len(snapshots) == 1:
+        base = sample_payload()
+        base["player"]["state"]["health"] -= 20
+        base["player"]["state"]["round_kills"] += 1
+        base["player"]["weapons"]["weapon_2"]["state"] = "reloading"
+        snapshots.append(GameState.from_payload(base))
+    pairs = list(zip(snapshots, snapshots[1:]))
+
+    def diff_by_field(pair):
+        new, old = pair[1], pair[0]
+        return tuple(f for f in GameState.FIELDS if getattr(new, f) != getattr(old, f))
+
+    print("状态比较:")
+    old = measure("逐字段 getattr 比较", diff_by_field, pairs, rounds)
+    new = measure("GameState.diff（按指纹位置比较）", lambda pair: pair[1].diff(pair[0]), pairs, rounds)
+    print(f"  加速比: {old / new:.2f}x")
+
+    print("WebSocket 帧编码:")
+    old = measure("json.dumps", lambda f: json.dumps(f, ensure_ascii=False), frames, rounds)
+    new = measure(f"json_codec.dumps ({json_codec.BACKEND})", json_codec.dumps, frames, rounds)
+    print(f"  加速比: {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
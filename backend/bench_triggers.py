@@ -0,0 +1,183 @@
+"""
+触发条件微基准
+对比每个 tick 计算触发条件的开销:
+- 逐条判断: 最初 check_and_trigger_events 中遍历所有事件、按 type 逐个 if/elif 判断的写法
+- 内置类型: TriggerEngine + 内置谓词（按字段索引，只计算受变化字段影响的条件）
+- 表达式: TriggerEngine + 与内置类型等价的表达式（编译为字节码）
+
+事件数按 --scale 倍复制默认事件配置，用于观察事件增多时每个 tick 的开销是否保持平稳
+
+用法:
+    python bench_triggers.py                         # 合成的状态序列
+    python bench_triggers.py -i recorded.jsonl.gz    # 录制的 GSI 数据
+    python bench_triggers.py --scale 1,10,100
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+from game_state import GameState
+from replay_gsi import read_records
+from triggers import TriggerEngine
+
+
+# 默认事件配置的触发条件，以及等价的表达式
+CONDITIONS = [
+    ({"type": "health_decrease", "min_damage": 1}, {"expr": "delta.health <= -1"}),
+    ({"type": "health_zero"}, {"expr": "health == 0 and old.health > 0"}),
+    ({"type": "flashed"}, {"expr": "flashed > 0 and old.flashed == 0"}),
+    ({"type": "smoked"}, {"expr": "smoked > 0 and old.smoked == 0"}),
+    ({"type": "burning"}, {"expr": "burning > 0", "level": True}),
+    ({"type": "round_phase", "value": "over"}, {"expr": "round_phase == 'over' and old.round_phase != 'over'"}),
+]
+
+
+def build_configs(scale: int, expression: bool) -> Dict[str, dict]:
+    configs = {}
+    for copy in range(scale):
+        for index, (builtin, equivalent) in enumerate(CONDITIONS):
+            condition = dict(equivalent, type="expression") if expression else dict(builtin)
+            configs[f"event_{copy}_{index}"] = {"enabled": True, "trigger_condition": condition}
+    return configs
+
+
+def ladder_evaluate(configs: Dict[str, dict], old: dict, new: dict) -> List[str]:
+    """最初的写法：每个 tick 遍历全部事件并按类型判断"""
+    matched = []
+    for event_id, config in configs.items():
+        if not config.get("enabled", False):
+            continue
+        trigger = config.get("trigger_condition", {})
+        trigger_type = trigger.get("type")
+        should_trigger = False
+        if trigger_type == "health_decrease":
+            if new["health"] < old["health"]:
+                if old["health"] - new["health"] >= trigger.get("min_damage", 1):
+                    should_trigger = True
+        elif trigger_type == "health_zero":
+            if new["health"] == 0 and old["health"] > 0:
+                should_trigger = True
+        elif trigger_type == "flashed":
+            if new["flashed"] > 0 and old["flashed"] == 0:
+                should_trigger = True
+        elif trigger_type == "smoked":
+            if new["smoked"] > 0 and old["smoked"] == 0:
+                should_trigger = True
+        elif trigger_type == "burning":
+            if new["burning"] > 0:
+                should_trigger = True
+        elif trigger_type == "round_phase":
+            target_phase = trigger.get("value")
+            if new["round_phase"] == target_phase and old["round_phase"] != target_phase:
+                should_trigger = True
+        if should_trigger:
+            matched.append(event_id)
+    return matched
+
+
+def synthetic_states(count: int, seed: int = 1) -> List[GameState]:
+    """模拟一局比赛的状态序列：大部分 tick 无变化，偶尔受伤、被闪、燃烧、回合切换"""
+    rng = random.Random(seed)
+    states = []
+    health, flashed, smoked, burning, phase = 100, 0, 0, 0, "live"
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.05 and health > 0:
+            health = max(0, health - rng.randint(1, 40))
+        elif roll < 0.07:
+            flashed = 255
+        elif roll < 0.09:
+            smoked = 100
+        elif roll < 0.10:
+            burning = 50
+        elif roll < 0.11:
+            phase = {"live": "over", "over": "freezetime", "freezetime": "live"}[phase]
+            if phase == "freezetime":
+                health = 100
+        flashed = max(0, flashed - 30)
+        smoked = 0 if rng.random() < 0.2 else smoked
+        burning = 0 if rng.random() < 0.3 else burning
+        states.append(GameState(health, flashed, smoked, burning, phase, "live"))
+    return states
+
+
+def recorded_states(path: str) -> List[GameState]:
+    import json_codec
+
+    states = []
+    for _, body in read_records(path):
+        try:
+            states.append(GameState.from_payload(json_codec.loads(body)))
+        except (KeyError, TypeError, AttributeError, ValueError):
+            continue
+    return states
+
+
+def measure(name: str, func: Callable[[], int], ticks: int, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fired = func()
+    per_tick = (time.perf_counter() - start) / (rounds * ticks) * 1e6
+    print(f"  {name:<12} {per_tick:8.3f} µs/tick   触发 {fired}")
+    return per_tick
+
+
+def run_scale(states: List[GameState], scale: int, rounds: int) -> Tuple[float, float, float]:
+    pairs = list(zip(states, states[1:]))
+    dict_pairs = [(old.to_dict(), new.to_dict()) for old, new in pairs]
+    diffs = [new.diff(old) for old, new in pairs]
+
+    ladder_configs = build_configs(scale, expression=False)
+    builtin_engine = TriggerEngine()
+    builtin_engine.compile(ladder_configs)
+    expression_engine = TriggerEngine()
+    expression_engine.compile(build_configs(scale, expression=True))
+
+    def ladder() -> int:
+        return sum(len(ladder_evaluate(ladder_configs, old, new)) for old, new in dict_pairs)
+
+    def engine(trigger_engine: TriggerEngine) -> Callable[[], int]:
+        evaluate = trigger_engine.evaluate
+
+        def run() -> int:
+            fired = 0
+            for (old, new), changed in zip(pairs, diffs):
+                fired += len(evaluate(old, new, changed))
+            return fired
+        return run
+
+    print(f"事件数 {len(ladder_configs)}:")
+    return (
+        measure("逐条判断", ladder, len(pairs), rounds),
+        measure("内置类型", engine(builtin_engine), len(pairs), rounds),
+        measure("表达式", engine(expression_engine), len(pairs), rounds),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="触发条件微基准")
+    parser.add_argument("-i", "--input", help="录制的 GSI 数据文件（JSON Lines，可为 .gz）")
+    parser.add_argument("--ticks", type=int, default=5000, help="合成状态序列的长度")
+    parser.add_argument("--scale", default="1,10,50", help="默认事件配置的复制倍数，逗号分隔")
+    parser.add_argument("-n", "--rounds", type=int, default=5, help="每组重复次数")
+    args = parser.parse_args()
+
+    states = recorded_states(args.input) if args.input else synthetic_states(args.ticks)
+    if len(states) < 2:
+        parser.error("状态序列过短")
+    changed = sum(1 for old, new in zip(states, states[1:]) if new.diff(old))
+    print(f"状态序列: {len(states)} 个 tick，其中 {changed} 个有变化")
+
+    results = [(scale, run_scale(states, scale, args.rounds))
+               for scale in (int(value) for value in args.scale.split(","))]
+
+    print("汇总 (µs/tick):")
+    print(f"  {'事件数':<8} {'逐条判断':>10} {'内置类型':>10} {'表达式':>10}")
+    for scale, (ladder, builtin, expression) in results:
+        print(f"  {scale * len(CONDITIONS):<10} {ladder:>12.3f} {builtin:>12.3f} {expression:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
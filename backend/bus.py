@@ -0,0 +1,374 @@
+"""
+进程间消息总线
+多进程模式下各 worker 通过总线共享 GSI 数据、游戏状态、事件通知和事件配置；
+单进程时使用进程内实现，发布即直接调用订阅者，没有额外开销
+
+总线地址（settings.json 的 cluster.bus）:
+- 空: 进程内（默认）
+- redis://host:6379/0: Redis（需要安装 redis 包）
+- unix:///tmp/cs2ycy-bus.sock 或 tcp://127.0.0.1:6390: bus_broker.py 提供的本地中转服务
+
+消息是可 JSON 编码的对象；同一进程发布的消息按发布顺序送达
+"""
+
+import asyncio
+import os
+import socket
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import json_codec
+from structured_log import get_logger
+
+
+log = get_logger("bus")
+
+Handler = Callable[[Any], None]
+
+# 当前进程的标识，用于选主和忽略自己发布的消息
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# 中转服务的帧格式: 4 字节大端长度 + JSON
+_FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def encode_frame(message: Any) -> bytes:
+    body = json_codec.dumps_bytes(message)
+    return _FRAME_HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Any:
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    (length,) = _FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"帧过大: {length} 字节")
+    return json_codec.loads(await reader.readexactly(length))
+
+
+def parse_address(url: str) -> Tuple[str, Any]:
+    """解析 unix:// 与 tcp:// 地址，返回 ("unix", path) 或 ("tcp", (host, port))"""
+    if url.startswith("unix://"):
+        return "unix", url[len("unix://"):]
+    if url.startswith("tcp://"):
+        host, _, port = url[len("tcp://"):].rpartition(":")
+        return "tcp", (host or "127.0.0.1", int(port))
+    raise ValueError(f"不支持的总线地址: {url}")
+
+
+class Bus:
+    """总线接口与订阅管理"""
+
+    # 是否跨进程共享（为 False 时调用方可以直接走单进程路径）
+    shared = False
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def subscribe(self, channel: str, handler: Handler):
+        handlers = self._handlers.setdefault(channel, [])
+        handlers.append(handler)
+        if len(handlers) == 1:
+            self._on_subscribe(channel)
+
+    def unsubscribe(self, channel: str, handler: Handler):
+        handlers = self._handlers.get(channel)
+        if not handlers or handler not in handlers:
+            return
+        handlers.remove(handler)
+        if not handlers:
+            del self._handlers[channel]
+            self._on_unsubscribe(channel)
+
+    def _on_subscribe(self, channel: str):
+        pass
+
+    def _on_unsubscribe(self, channel: str):
+        pass
+
+    def _deliver(self, channel: str, message: Any):
+        for handler in tuple(self._handlers.get(channel, ())):
+            self.delivered += 1
+            try:
+                handler(message)
+            except Exception as e:
+                log.error("✗ 处理总线消息失败", channel=channel, error=e)
+
+    async def publish(self, channel: str, message: Any) -> bool:
+        """发布消息，返回时消息已交给总线；未能交给总线（例如连接断开）时返回 False"""
+        self.publish_nowait(channel, message)
+        return True
+
+    def publish_nowait(self, channel: str, message: Any):
+        """发布消息，不等待发送完成"""
+        raise NotImplementedError
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """获取或续期一个带过期时间的锁（用于选主），成功返回 True"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {
+            "type": type(self).__name__,
+            "channels": sorted(self._handlers),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+class LocalBus(Bus):
+    """进程内总线：发布时直接调用订阅者"""
+
+    def publish_nowait(self, channel: str, message: Any):
+        self.published += 1
+        self._deliver(channel, message)
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        return True
+
+
+class BrokerBus(Bus):
+    """连接 bus_broker.py 的总线，断线后自动重连并重新订阅"""
+
+    shared = True
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self.address = parse_address(url)
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected: Optional[asyncio.Event] = None
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._next_request = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    async def start(self):
+        self._connected = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="bus-broker")
+        try:
+            await asyncio.wait_for(self._connected.wait(), 5.0)
+        except asyncio.TimeoutError:
+            log.warning("✗ 暂时无法连接总线中转服务，将在后台重试", url=self.url)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _open(self):
+        kind, target = self.address
+        if kind == "unix":
+            return await asyncio.open_unix_connection(target)
+        return await asyncio.open_connection(*target)
+
+    async def _run(self):
+        delay = 0.2
+        while True:
+            try:
+                reader, writer = await self._open()
+            except OSError as e:
+                log.warning("✗ 连接总线中转服务失败", url=self.url, error=e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+
+            delay = 0.2
+            self._writer = writer
+            for channel in self._handlers:
+                writer.write(encode_frame({"op": "sub", "ch": channel}))
+            self._connected.set()
+            try:
+                while True:
+                    frame = await read_frame(reader)
+                    op = frame.get("op")
+                    if op == "msg":
+                        self._deliver(frame["ch"], frame["data"])
+                    elif op == "reply":
+                        future = self._requests.pop(frame["id"], None)
+                        if future is not None and not future.done():
+                            future.set_result(frame.get("ok"))
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                log.warning("✗ 总线连接断开，正在重连", url=self.url, error=e)
+            finally:
+                self._connected.clear()
+                self._writer = None
+                writer.close()
+                for future in self._requests.values():
+                    if not future.done():
+                        future.set_result(False)
+                self._requests.clear()
+                self.reconnects += 1
+
+    def _send(self, frame: dict) -> bool:
+        if self._writer is None:
+            self.dropped += 1
+            return False
+        self._writer.write(encode_frame(frame))
+        return True
+
+    def _on_subscribe(self, channel: str):
+        # 未连接时不需要发送，连接建立后会重新订阅所有频道
+        if self._writer is not None:
+            self._writer.write(encode_frame({"op": "sub", "ch": channel}))
+
+    def _on_unsubscribe(self, channel: str):
+        if self._writer is not None:
+            self._writer.write(encode_frame({"op": "unsub", "ch": channel}))
+
+    async def publish(self, channel: str, message: Any) -> bool:
+        if not self._send({"op": "pub", "ch": channel, "data": message}):
+            return False
+        self.published += 1
+        try:
+            await self._writer.drain()
+        except OSError:
+            return False
+        return True
+
+    def publish_nowait(self, channel: str, message: Any):
+        if self._send({"op": "pub", "ch": channel, "data": message}):
+            self.published += 1
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        self._next_request += 1
+        request_id = self._next_request
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = future
+        if not self._send({"op": "lock", "id": request_id, "name": name, "owner": owner, "ttl": ttl}):
+            self._requests.pop(request_id, None)
+            return False
+        try:
+            return bool(await asyncio.wait_for(future, ttl))
+        except asyncio.TimeoutError:
+            self._requests.pop(request_id, None)
+            return False
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(url=self.url, connected=self._writer is not None,
+                     dropped=self.dropped, reconnects=self.reconnects)
+        return stats
+
+
+# 锁不存在时设置，属于自己时续期
+_RENEW_LOCK_SCRIPT = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then return 1 end
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end
+return 0
+"""
+
+
+class RedisBus(Bus):
+    """基于 Redis 发布/订阅的总线（需要 pip install redis）"""
+
+    shared = True
+    prefix = "cs2ycy:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("使用 Redis 总线需要安装 redis 包: pip install redis")
+        self.url = url
+        self._client = aioredis.Redis.from_url(url)
+        self._pubsub = self._client.pubsub()
+        self._outgoing: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.dropped = 0
+
+    async def start(self):
+        self._outgoing = asyncio.Queue()
+        if self._handlers:
+            await self._pubsub.subscribe(*(self.prefix + channel for channel in self._handlers))
+        self._tasks = [
+            asyncio.create_task(self._listen(), name="bus-redis-listen"),
+            asyncio.create_task(self._send_loop(), name="bus-redis-send"),
+        ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._pubsub.close()
+        await self._client.close()
+
+    def _on_subscribe(self, channel: str):
+        if self._tasks:
+            asyncio.ensure_future(self._pubsub.subscribe(self.prefix + channel))
+
+    def _on_unsubscribe(self, channel: str):
+        if self._tasks:
+            asyncio.ensure_future(self._pubsub.unsubscribe(self.prefix + channel))
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                log.warning("✗ 读取 Redis 消息失败", error=e)
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            self._deliver(channel[len(self.prefix):], json_codec.loads(message["data"]))
+
+    async def _send_loop(self):
+        # 单个发送协程保证同一进程发布的消息按顺序到达
+        while True:
+            channel, data, done = await self._outgoing.get()
+            try:
+                await self._client.publish(self.prefix + channel, data)
+                self.published += 1
+                sent = True
+            except Exception as e:
+                self.dropped += 1
+                sent = False
+                log.warning("✗ 发布 Redis 消息失败", channel=channel, error=e)
+            if done is not None and not done.done():
+                done.set_result(sent)
+
+    async def publish(self, channel: str, message: Any) -> bool:
+        done = asyncio.get_running_loop().create_future()
+        self._outgoing.put_nowait((channel, json_codec.dumps_bytes(message), done))
+        return await done
+
+    def publish_nowait(self, channel: str, message: Any):
+        self._outgoing.put_nowait((channel, json_codec.dumps_bytes(message), None))
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        result = await self._client.eval(_RENEW_LOCK_SCRIPT, 1, self.prefix + name, owner, int(ttl * 1000))
+        return bool(result)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(url=self.url, pending=self._outgoing.qsize() if self._outgoing else 0,
+                     dropped=self.dropped)
+        return stats
+
+
+def create_bus(url: str) -> Bus:
+    """按地址创建总线，地址为空时使用进程内总线"""
+    if not url or url == "local":
+        return LocalBus()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBus(url)
+    return BrokerBus(url)
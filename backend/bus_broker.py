@@ -0,0 +1,118 @@
+"""
+本地总线中转服务
+多进程模式下各 worker 连接到这里交换消息（见 bus.py 的 BrokerBus），不需要安装 Redis
+
+用法:
+    python bus_broker.py                                  # 监听 tcp://127.0.0.1:6390
+    python bus_broker.py --listen unix:///tmp/cs2ycy-bus.sock
+
+协议: 每帧为 4 字节大端长度 + JSON
+- {"op": "sub" / "unsub", "ch": 频道}
+- {"op": "pub", "ch": 频道, "data": 消息}  -> 转发给所有订阅者 {"op": "msg", "ch": 频道, "data": 消息}
+- {"op": "lock", "id": n, "name": 锁名, "owner": 持有者, "ttl": 秒}  -> {"op": "reply", "id": n, "ok": 是否获得}
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, Set, Tuple
+
+from bus import encode_frame, parse_address, read_frame
+
+
+# 订阅者发送缓冲超过该大小时断开（慢消费者不拖慢其他 worker）
+MAX_BUFFERED = 8 * 1024 * 1024
+
+
+class Broker:
+    """频道订阅表与带过期时间的锁"""
+
+    def __init__(self):
+        self.channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.locks: Dict[str, Tuple[str, float]] = {}
+        self.connections = 0
+        self.messages = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        subscribed: Set[str] = set()
+        try:
+            while True:
+                frame = await read_frame(reader)
+                op = frame.get("op")
+                if op == "pub":
+                    self.publish(frame["ch"], frame.get("data"))
+                elif op == "sub":
+                    self.channels.setdefault(frame["ch"], set()).add(writer)
+                    subscribed.add(frame["ch"])
+                elif op == "unsub":
+                    self._remove(frame["ch"], writer)
+                    subscribed.discard(frame["ch"])
+                elif op == "lock":
+                    ok = self.acquire(frame["name"], frame["owner"], float(frame["ttl"]))
+                    writer.write(encode_frame({"op": "reply", "id": frame["id"], "ok": ok}))
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._remove(channel, writer)
+            self.connections -= 1
+            writer.close()
+
+    def _remove(self, channel: str, writer: asyncio.StreamWriter):
+        writers = self.channels.get(channel)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self.channels[channel]
+
+    def publish(self, channel: str, data):
+        writers = self.channels.get(channel)
+        if not writers:
+            return
+        self.messages += 1
+        frame = encode_frame({"op": "msg", "ch": channel, "data": data})
+        for writer in tuple(writers):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                print(f"✗ 断开处理过慢的 worker: 频道 {channel}")
+                writer.close()
+                self._remove(channel, writer)
+                continue
+            writer.write(frame)
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.monotonic()
+        holder = self.locks.get(name)
+        if holder is None or holder[1] <= now or holder[0] == owner:
+            self.locks[name] = (owner, now + ttl)
+            return True
+        return False
+
+
+async def serve(url: str):
+    broker = Broker()
+    kind, target = parse_address(url)
+    if kind == "unix":
+        if os.path.exists(target):
+            os.unlink(target)
+        server = await asyncio.start_unix_server(broker.handle, target)
+    else:
+        server = await asyncio.start_server(broker.handle, *target)
+    print(f"总线中转服务已启动: {url}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地总线中转服务")
+    parser.add_argument("--listen", default="tcp://127.0.0.1:6390", help="监听地址（tcp://host:port 或 unix://path）")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.listen))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
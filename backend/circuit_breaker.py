@@ -0,0 +1,117 @@
+"""
+熔断器与重试预算
+IM 服务不可用时快速失败，避免每条指令都等待完整的请求超时
+"""
+
+import random
+import time
+
+from structured_log import get_logger
+
+
+log = get_logger("circuit_breaker")
+
+
+class CircuitBreaker:
+    """三态熔断器
+
+    - closed: 正常放行，连续失败 failure_threshold 次后进入 open
+    - open: 直接拒绝，reset_timeout 秒后（或健康检查成功时）进入 half_open
+    - half_open: 只放行一个试探请求，成功则 closed，失败则重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.opened = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """是否允许发出请求"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            else:
+                self.rejected += 1
+                return False
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                self.rejected += 1
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self._trial_in_flight = False
+        self.failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+                log.warning("✗ IM 服务连续失败，暂停发送", failures=self.failures,
+                            state=self.state, reset_after=self.reset_timeout)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """试探请求被取消、没有结果时释放试探名额，不计成功或失败"""
+        self._trial_in_flight = False
+
+    def probe_succeeded(self):
+        """健康检查成功，提前进入 half_open 等待试探请求
+
+        已在 half_open 时同样释放试探名额，避免试探请求异常退出后一直卡在 half_open
+        """
+        if self.state == self.OPEN or self.state == self.HALF_OPEN:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """重试预算：每个请求存入 ratio 个令牌，每次重试消耗一个，最多存 max_tokens 个"""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.retries += 1
+            return True
+        self.exhausted += 1
+        return False
+
+    def stats(self) -> dict:
+        return {"tokens": round(self.tokens, 2), "retries": self.retries, "exhausted": self.exhausted}
+
+
+def backoff_delay(attempt: int, base: float = 0.05, cap: float = 1.0) -> float:
+    """指数退避加全抖动"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,246 @@
+"""
+IM 指令调度与合并发送
+指令按优先级排队（数值越大越优先，同优先级先进先出），短时间窗口内的指令合并成一次批量请求；
+IM 服务不支持批量接口时自动退回逐条发送
+
+- 同一玩家的同一指令在发送前再次提交时，旧的一条被新的一条取代
+- 高优先级指令到达时，同一玩家等待超过 stale_after 秒的低优先级指令被丢弃
+  （不同玩家的指令互不影响）
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from im_client import BatchNotSupported, IMClient
+from metrics import metrics
+from structured_log import get_logger
+
+
+log = get_logger("commands")
+
+
+class PendingCommand:
+    """排队中的指令"""
+
+    __slots__ = ("command_id", "session_id", "priority", "submitted_at", "future", "cancelled")
+
+    def __init__(self, command_id: str, priority: int, future: asyncio.Future,
+                 session_id: Optional[str] = None):
+        self.command_id = command_id
+        self.session_id = session_id
+        self.priority = priority
+        self.submitted_at = time.monotonic()
+        self.future = future
+        self.cancelled = False
+
+
+class CommandBatcher:
+    """按优先级收集指令并按窗口批量发送
+
+    window: 收集窗口（秒），第一条指令到达后等待该时间再发送
+    max_batch: 单次批量请求的最大指令数，达到后立即发送
+    enabled: 为 False 时每条指令单独发送（仍然保持顺序）
+    stale_after: 低优先级指令的过期时间（秒），0 表示不丢弃
+    """
+
+    def __init__(self, client: IMClient, window: float = 0.01, max_batch: int = 20,
+                 enabled: bool = True, stale_after: float = 1.0):
+        self.client = client
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.batch_supported = enabled
+        self.stale_after = stale_after
+        # 堆元素: (-优先级, 序号, PendingCommand)
+        self._heap: List[tuple] = []
+        # (玩家, 指令) -> 排队中的指令
+        self._by_command: Dict[Tuple[Optional[str], str], PendingCommand] = {}
+        self._pending_count = 0
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.batches = 0
+        self.single_sends = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.superseded = 0
+        self.preempted = 0
+        # 优先级 -> [次数, 总等待时间, 最大等待时间]
+        self.queue_delay: Dict[int, list] = {}
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        if self._pending_count:
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._run(), name="command-batcher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def submit(self, command_id: str, priority: int = 0,
+               session_id: Optional[str] = None) -> asyncio.Future:
+        """提交一条指令，返回在发送完成后得到 IM 服务结果的 Future
+
+        session_id: 触发该指令的玩家，取代和抢占只在同一玩家的指令之间发生
+        """
+        future = asyncio.get_running_loop().create_future()
+        command = PendingCommand(command_id, priority, future, session_id)
+        key = (session_id, command_id)
+
+        previous = self._by_command.get(key)
+        if previous is not None:
+            self._drop(previous, "已被新的相同指令取代", "superseded")
+            self.superseded += 1
+        if self.stale_after > 0 and self._pending_count:
+            self._preempt(priority, session_id, command.submitted_at)
+
+        heapq.heappush(self._heap, (-priority, next(self._seq), command))
+        self._by_command[key] = command
+        self._pending_count += 1
+        self.submitted += 1
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+            if self._pending_count >= self.max_batch:
+                self._full.set()
+        return future
+
+    def _drop(self, command: PendingCommand, message: str, reason: str):
+        """丢弃排队中的指令，reason 为 superseded（被取代）或 preempted（被抢占）"""
+        command.cancelled = True
+        self._pending_count -= 1
+        key = (command.session_id, command.command_id)
+        if self._by_command.get(key) is command:
+            del self._by_command[key]
+        if not command.future.done():
+            command.future.set_result(
+                {"success": False, "message": message, "dropped": True, "reason": reason})
+
+    def _preempt(self, priority: int, session_id: Optional[str], now: float):
+        """丢弃同一玩家等待过久的低优先级指令"""
+        deadline = now - self.stale_after
+        for _, _, command in self._heap:
+            if not command.cancelled and command.priority < priority and \
+                    command.session_id == session_id and command.submitted_at <= deadline:
+                self._drop(command, "等待超时，被高优先级指令抢占", "preempted")
+                self.preempted += 1
+                log.warning("丢弃过期指令", command=command.command_id, priority=command.priority)
+
+    def _take_batch(self) -> List[PendingCommand]:
+        batch = []
+        while self._heap and len(batch) < self.max_batch:
+            command = heapq.heappop(self._heap)[2]
+            if command.cancelled:
+                continue
+            self._pending_count -= 1
+            key = (command.session_id, command.command_id)
+            if self._by_command.get(key) is command:
+                del self._by_command[key]
+            batch.append(command)
+        return batch
+
+    def _record_delay(self, batch: List[PendingCommand]):
+        now = time.monotonic()
+        for command in batch:
+            delay = now - command.submitted_at
+            metrics.observe("command_wait", delay)
+            record = self.queue_delay.get(command.priority)
+            if record is None:
+                self.queue_delay[command.priority] = [1, delay, delay]
+            else:
+                record[0] += 1
+                record[1] += delay
+                if delay > record[2]:
+                    record[2] = delay
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if self.window > 0 and self._pending_count < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._take_batch()
+            if not self._pending_count:
+                self._heap.clear()
+                self._wakeup.clear()
+                self._full.clear()
+
+            if batch:
+                self._record_delay(batch)
+                await self._send(batch)
+
+    async def _send(self, batch: List[PendingCommand]):
+        command_ids = [command.command_id for command in batch]
+        try:
+            if self.batch_supported and len(batch) > 1:
+                try:
+                    results = await self.client.send_commands(command_ids)
+                    self.batches += 1
+                except BatchNotSupported:
+                    log.warning("IM 服务不支持批量接口，改为逐条发送")
+                    self.batch_supported = False
+                    results = await self._send_each(command_ids)
+            else:
+                results = await self._send_each(command_ids)
+        except Exception as e:
+            log.error("✗ 调用 IM 服务失败", error=e, commands=len(batch))
+            results = [{"success": False, "message": str(e)} for _ in batch]
+
+        now = time.monotonic()
+        for command, result in zip(batch, results):
+            latency_ms = round((now - command.submitted_at) * 1000, 1)
+            if result.get("success"):
+                self.succeeded += 1
+                log.info("✓ 指令发送成功", command=command.command_id, latency_ms=latency_ms)
+            else:
+                self.failed += 1
+                log.warning("✗ 指令发送失败", command=command.command_id,
+                            error=result.get("message"), latency_ms=latency_ms)
+            if not command.future.done():
+                command.future.set_result(result)
+
+    async def _send_each(self, command_ids: List[str]) -> List[dict]:
+        results = []
+        for command_id in command_ids:
+            try:
+                results.append(await self.client.send_command(command_id))
+            except Exception as e:
+                log.error("✗ 调用 IM 服务失败", error=e, command=command_id)
+                results.append({"success": False, "message": str(e)})
+            self.single_sends += 1
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending_count,
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "single_sends": self.single_sends,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "superseded": self.superseded,
+            "preempted": self.preempted,
+            "batch_supported": self.batch_supported,
+            "queue_delay_ms": {
+                str(priority): {
+                    "count": count,
+                    "avg": round(total / count * 1000, 2),
+                    "max": round(peak * 1000, 2),
+                }
+                for priority, (count, total, peak) in sorted(self.queue_delay.items(), reverse=True)
+            },
+        }
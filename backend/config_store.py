@@ -0,0 +1,103 @@
+"""
+配置文件持久化
+修改先合并到一个延迟窗口内，再在线程池中以“写临时文件 + 重命名”的方式原子写入，
+避免在事件循环中做同步文件 IO，也避免写到一半崩溃导致配置损坏
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional
+
+from structured_log import get_logger
+
+
+log = get_logger("config")
+
+
+def write_json_atomic(path: Path, text: str):
+    """原子写入：先写同目录临时文件并 fsync，再替换目标文件"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DebouncedJsonWriter:
+    """合并写入的 JSON 文件保存器
+
+    get_data: 返回要保存的最新数据，在实际写入时才调用，因此窗口内的多次修改只写一次
+    delay: 合并窗口（秒）
+    """
+
+    def __init__(self, path: Path, get_data: Callable[[], object], delay: float = 0.5):
+        self.path = Path(path)
+        self.get_data = get_data
+        self.delay = delay
+        self.writes = 0
+        self.requests = 0
+        self._dirty = False
+        self._timer: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _encode(self) -> str:
+        return json.dumps(self.get_data(), ensure_ascii=False, indent=2)
+
+    def schedule(self):
+        """请求保存，窗口结束后写入；不在事件循环中时直接同步写入"""
+        self.requests += 1
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            write_json_atomic(self.path, self._encode())
+            self.writes += 1
+            return
+
+        self._dirty = True
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._delayed_write())
+
+    async def _delayed_write(self):
+        await asyncio.sleep(self.delay)
+        # 已开始的写入不随定时器取消而中断
+        await asyncio.shield(self._write())
+
+    async def _write(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            # 在事件循环中编码（保证读到一致的数据），在线程池中写文件
+            text = self._encode()
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, write_json_atomic, self.path, text)
+                self.writes += 1
+            except OSError as e:
+                self._dirty = True
+                log.error("✗ 保存配置失败", error=e)
+
+    async def flush(self):
+        """立即写入尚未保存的修改（应用退出时调用）"""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+        self._timer = None
+        await self._write()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "writes": self.writes, "pending": self._dirty}
@@ -0,0 +1,135 @@
+"""
+事件分发队列
+GSI 请求只负责把匹配到的事件放入有界队列，由后台 worker 调用 IM 服务并通知前端
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from metrics import metrics
+from structured_log import get_logger
+
+
+log = get_logger("dispatch")
+
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "reject")
+
+
+class DispatchQueue:
+    """有界异步分发队列
+
+    溢出策略:
+    - drop_oldest: 队列满时丢弃最早的任务
+    - coalesce: 同一 key 的任务未处理时直接用新任务替换；队列满且无可合并项时拒绝
+    - reject: 队列满时拒绝新任务
+    """
+
+    def __init__(self, handler: Callable[[Any], Awaitable[None]], maxsize: int = 256,
+                 workers: int = 2, overflow_policy: str = "drop_oldest"):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow_policy}")
+        self.handler = handler
+        self.maxsize = max(1, maxsize)
+        self.worker_count = max(1, workers)
+        self.overflow_policy = overflow_policy
+
+        # 每个条目为 [key, job, 入队时间]，coalesce 时原地替换 job
+        self._entries: Deque[list] = deque()
+        self._pending: Dict[Any, list] = {}
+        self._ready = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._seq = itertools.count()
+
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def start(self):
+        """启动后台 worker"""
+        if self._workers:
+            return
+        self._ready = asyncio.Event()
+        if self._entries:
+            self._ready.set()
+        for i in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"dispatch-{i}"))
+
+    async def stop(self):
+        """停止 worker，未处理的任务会被丢弃"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job: Any, key: Optional[Any] = None) -> bool:
+        """放入任务，立即返回；被拒绝时返回 False"""
+        if self.overflow_policy == "coalesce" and key is not None:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1] = job
+                self.coalesced += 1
+                return True
+
+        if len(self._entries) >= self.maxsize:
+            if self.overflow_policy == "drop_oldest":
+                self._discard(self._entries.popleft())
+                self.dropped += 1
+            else:
+                self.rejected += 1
+                return False
+
+        if key is None:
+            key = ("_", next(self._seq))
+        entry = [key, job, time.perf_counter()]
+        self._entries.append(entry)
+        self._pending[key] = entry
+        self.enqueued += 1
+        self._ready.set()
+        return True
+
+    def _discard(self, entry: list):
+        if self._pending.get(entry[0]) is entry:
+            del self._pending[entry[0]]
+
+    async def _worker(self):
+        while True:
+            if not self._entries:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            entry = self._entries.popleft()
+            self._discard(entry)
+            metrics.observe("queue_wait", time.perf_counter() - entry[2])
+            try:
+                await self.handler(entry[1])
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                log.error("✗ 事件分发失败", error=e)
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "queue_size": len(self._entries),
+            "max_size": self.maxsize,
+            "workers": self.worker_count,
+            "overflow_policy": self.overflow_policy,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
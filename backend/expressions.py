@@ -0,0 +1,235 @@
+"""
+触发条件表达式
+事件配置中的表达式在配置加载/修改时解析一次，校验后编译成普通的 Python 函数 (old, new) -> bool，
+每个 tick 的计算开销与手写的谓词相同，不会重新解析
+
+语法为 Python 表达式的子集:
+    health                      新状态的字段（等同于 new.health）
+    old.health / new.health     上一个 tick / 本 tick 的字段
+    delta.health                本 tick 相对上一个 tick 的变化量（new - old，只能用于数值字段）
+    + - * / // %                算术运算（操作数只能是数值，不能是字符串字段或字符串字面量）
+    == != < <= > >= in not in   比较（可以连写，如 0 < health <= 30）
+    and or not                  布尔组合
+    abs() min() max()           内置函数
+    "live" 10 1.5 true false    字面量，in 的右侧可以是字面量列表 ("live", "over")
+
+示例:
+    delta.health <= -30 and armor == 0
+    kills > old.kills and health < 20
+    ammo_clip == 0 and old.ammo_clip > 0
+"""
+
+import ast
+from functools import lru_cache
+from typing import Callable, FrozenSet
+
+from game_state import GameState
+
+
+# 表达式中可用的函数
+FUNCTIONS = {"abs": abs, "min": min, "max": max}
+
+_NAMES = {"true": True, "false": False, "True": True, "False": False, "none": None, "None": None}
+
+# 字符串类型的字段（不能参与算术运算）
+_STRING_FIELDS = frozenset(f for f in GameState.FIELDS if isinstance(getattr(GameState(), f), str))
+
+_BOOL_OPS = (ast.And, ast.Or)
+_UNARY_OPS = (ast.Not, ast.USub, ast.UAdd)
+_BIN_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod)
+_CMP_OPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn)
+
+# 表达式长度和语法树嵌套深度的上限：解析、校验和编译都是递归实现，
+# 如 "not not ... health" 这类嵌套过深的表达式会耗尽调用栈
+MAX_LENGTH = 1000
+MAX_DEPTH = 50
+
+
+class ExpressionError(ValueError):
+    """表达式语法错误或引用了不存在的字段"""
+
+
+class CompiledExpression:
+    """编译后的表达式
+
+    function: (old, new) -> 结果
+    fields: 引用的状态字段
+    uses_old: 是否引用了上一个 tick 的值（不引用时条件只与当前状态有关）
+    """
+
+    __slots__ = ("source", "function", "fields", "uses_old")
+
+    def __init__(self, source: str, function: Callable, fields: FrozenSet[str], uses_old: bool):
+        self.source = source
+        self.function = function
+        self.fields = fields
+        self.uses_old = uses_old
+
+
+class _Compiler(ast.NodeTransformer):
+    """校验语法树，并把字段引用改写为对 old/new 的属性访问"""
+
+    def __init__(self):
+        self.fields = set()
+        self.uses_old = False
+
+    def generic_visit(self, node):
+        raise ExpressionError(f"不支持的语法: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_BoolOp(self, node):
+        if not isinstance(node.op, _BOOL_OPS):
+            raise ExpressionError("不支持的运算符")
+        node.values = [self.visit(value) for value in node.values]
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARY_OPS):
+            raise ExpressionError("不支持的运算符")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BIN_OPS):
+            raise ExpressionError("不支持的运算符")
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        # 只允许数值参与算术，避免 "a" * 1000000000 这类表达式在计算时占用大量内存
+        if not (_is_numeric(node.left) and _is_numeric(node.right)):
+            raise ExpressionError("算术运算只能用于数值")
+        return node
+
+    def visit_Compare(self, node):
+        for op in node.ops:
+            if not isinstance(op, _CMP_OPS):
+                raise ExpressionError("不支持的比较运算符")
+        node.left = self.visit(node.left)
+        node.comparators = [self.visit(c) for c in node.comparators]
+        return node
+
+    def visit_Constant(self, node):
+        if not isinstance(node.value, (int, float, str, bool, type(None))):
+            raise ExpressionError(f"不支持的字面量: {node.value!r}")
+        return node
+
+    def visit_Tuple(self, node):
+        if not all(isinstance(element, ast.Constant) for element in node.elts):
+            raise ExpressionError("列表中只能包含字面量")
+        for element in node.elts:
+            self.visit(element)
+        return ast.copy_location(ast.Constant(tuple(e.value for e in node.elts)), node)
+
+    # 列表字面量按元组处理
+    visit_List = visit_Tuple
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError("只能调用 " + "、".join(FUNCTIONS))
+        if node.keywords or not node.args:
+            raise ExpressionError(f"{node.func.id}() 参数错误")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_Name(self, node):
+        if node.id in _NAMES:
+            return ast.copy_location(ast.Constant(_NAMES[node.id]), node)
+        return self._field("new", node.id, node)
+
+    def visit_Attribute(self, node):
+        if not isinstance(node.value, ast.Name) or node.value.id not in ("old", "new", "delta"):
+            raise ExpressionError("字段只能通过 old.字段、new.字段 或 delta.字段 引用")
+        scope = node.value.id
+        if scope == "delta":
+            if node.attr in _STRING_FIELDS:
+                raise ExpressionError(f"delta 只能用于数值字段: {node.attr}")
+            # delta.x 改写为 (new.x - old.x)
+            return ast.copy_location(ast.BinOp(
+                left=self._field("new", node.attr, node),
+                op=ast.Sub(),
+                right=self._field("old", node.attr, node),
+            ), node)
+        return self._field(scope, node.attr, node)
+
+    def _field(self, scope: str, field: str, node) -> ast.Attribute:
+        if field not in GameState.FIELDS:
+            raise ExpressionError(f"未知字段: {field}")
+        self.fields.add(field)
+        if scope == "old":
+            self.uses_old = True
+        return ast.copy_location(
+            ast.Attribute(value=ast.Name(id=scope, ctx=ast.Load()), attr=field, ctx=ast.Load()), node)
+
+
+def _is_numeric(node) -> bool:
+    """已校验的节点的计算结果是否一定是数值（含布尔值）"""
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (int, float))
+    if isinstance(node, ast.Attribute):
+        return node.attr not in _STRING_FIELDS
+    if isinstance(node, (ast.BinOp, ast.Compare)):
+        # BinOp 的操作数在 visit_BinOp 中已检查
+        return True
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, ast.Not) or _is_numeric(node.operand)
+    if isinstance(node, ast.BoolOp):
+        return all(_is_numeric(value) for value in node.values)
+    if isinstance(node, ast.Call):
+        return all(_is_numeric(arg) for arg in node.args)
+    return False
+
+
+def _check_depth(tree: ast.AST):
+    """逐层遍历语法树（不递归），嵌套超过 MAX_DEPTH 层时报错"""
+    level = [tree]
+    depth = 0
+    while level:
+        depth += 1
+        if depth > MAX_DEPTH:
+            raise ExpressionError(f"表达式嵌套过深（最多 {MAX_DEPTH} 层）")
+        level = [child for node in level for child in ast.iter_child_nodes(node)]
+
+
+@lru_cache(maxsize=256)
+def compile_expression(source: str) -> CompiledExpression:
+    """解析并编译表达式（相同的表达式只编译一次）"""
+    if not isinstance(source, str) or not source.strip():
+        raise ExpressionError("表达式为空")
+    if len(source) > MAX_LENGTH:
+        raise ExpressionError(f"表达式过长（最多 {MAX_LENGTH} 个字符）")
+    try:
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"语法错误: {e.msg}")
+        _check_depth(tree)
+
+        compiler = _Compiler()
+        tree = compiler.visit(tree)
+        if not compiler.fields:
+            raise ExpressionError("表达式没有引用任何状态字段")
+
+        # 包装成 lambda old, new: <表达式> 编译为字节码，运行时只能访问 old、new 和 FUNCTIONS
+        arguments = ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg="old"), ast.arg(arg="new")], vararg=None,
+            kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+        function_tree = ast.Expression(body=ast.Lambda(args=arguments, body=tree.body))
+        ast.fix_missing_locations(function_tree)
+        code = compile(function_tree, "<trigger>", "eval")
+        function = eval(code, {"__builtins__": {}, **FUNCTIONS})
+    except (RecursionError, MemoryError):
+        raise ExpressionError("表达式过于复杂")
+
+    # 用默认状态试算一次，提前发现类型错误（如字符串与数字比较）
+    default_state = GameState()
+    try:
+        function(default_state, default_state)
+    except ZeroDivisionError:
+        pass
+    except Exception as e:
+        raise ExpressionError(f"计算错误: {e or type(e).__name__}")
+
+    return CompiledExpression(source, function, frozenset(compiler.fields), compiler.uses_old)
+
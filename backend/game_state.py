@@ -0,0 +1,141 @@
+"""
+游戏状态快照
+每个 GSI tick 从请求数据构建一次，创建后不可修改，通过整体替换引用来更新
+"""
+
+from itertools import compress
+from operator import ne
+from typing import Tuple
+
+
+class GameState:
+    """不可变的游戏状态快照
+
+    除血量和各类状态外，还包含本回合/整场比赛的统计和当前武器的弹药，供触发条件表达式使用；
+    当前武器没有弹匣（刀、手雷等）时 ammo_clip 为 -1
+    """
+
+    FIELDS = ("health", "is_alive", "flashed", "smoked", "burning", "round_phase", "map_phase",
+              "armor", "money", "round_kills", "round_killhs",
+              "kills", "assists", "deaths", "mvps", "score",
+              "weapon", "ammo_clip", "ammo_reserve", "reloading")
+    # 构造参数（即指纹）各位置对应的字段
+    ARGUMENT_FIELDS = tuple(f for f in FIELDS if f != "is_alive")
+    # _values 保存构造参数，用于快速比较
+    __slots__ = FIELDS + ("_values",)
+
+    def __init__(self, health: int = 100, flashed: int = 0, smoked: int = 0, burning: int = 0,
+                 round_phase: str = "unknown", map_phase: str = "unknown",
+                 armor: int = 0, money: int = 0, round_kills: int = 0, round_killhs: int = 0,
+                 kills: int = 0, assists: int = 0, deaths: int = 0, mvps: int = 0, score: int = 0,
+                 weapon: str = "", ammo_clip: int = -1, ammo_reserve: int = 0, reloading: bool = False):
+        set_field = object.__setattr__
+        set_field(self, "_values", (
+            health, flashed, smoked, burning, round_phase, map_phase, armor, money, round_kills,
+            round_killhs, kills, assists, deaths, mvps, score, weapon, ammo_clip, ammo_reserve, reloading))
+        set_field(self, "health", health)
+        set_field(self, "is_alive", health > 0)
+        set_field(self, "flashed", flashed)
+        set_field(self, "smoked", smoked)
+        set_field(self, "burning", burning)
+        set_field(self, "round_phase", round_phase)
+        set_field(self, "map_phase", map_phase)
+        set_field(self, "armor", armor)
+        set_field(self, "money", money)
+        set_field(self, "round_kills", round_kills)
+        set_field(self, "round_killhs", round_killhs)
+        set_field(self, "kills", kills)
+        set_field(self, "assists", assists)
+        set_field(self, "deaths", deaths)
+        set_field(self, "mvps", mvps)
+        set_field(self, "score", score)
+        set_field(self, "weapon", weapon)
+        set_field(self, "ammo_clip", ammo_clip)
+        set_field(self, "ammo_reserve", ammo_reserve)
+        set_field(self, "reloading", reloading)
+
+    @staticmethod
+    def fingerprint(data: dict) -> tuple:
+        """提取 GSI 请求中与状态相关的字段，按构造参数顺序返回
+
+        相同的指纹意味着构建出的快照完全相同，可直接跳过处理
+        """
+        player = data["player"]
+        player_state = player["state"]
+        round_data = data.get("round")
+        map_data = data.get("map")
+        match_stats = player.get("match_stats") or {}
+
+        # 手中的武器状态为 active，换弹过程中为 reloading
+        weapon, ammo_clip, ammo_reserve, reloading = "", -1, 0, False
+        for item in (player.get("weapons") or {}).values():
+            weapon_state = item.get("state")
+            if weapon_state == "active" or weapon_state == "reloading":
+                weapon = item.get("name", "")
+                ammo_clip = item.get("ammo_clip", -1)
+                ammo_reserve = item.get("ammo_reserve", 0)
+                reloading = weapon_state == "reloading"
+                break
+
+        return (
+            player_state["health"],
+            player_state.get("flashed", 0),
+            player_state.get("smoked", 0),
+            player_state.get("burning", 0),
+            round_data.get("phase", "unknown") if round_data else "unknown",
+            map_data.get("phase", "unknown") if map_data else "unknown",
+            player_state.get("armor", 0),
+            player_state.get("money", 0),
+            player_state.get("round_kills", 0),
+            player_state.get("round_killhs", 0),
+            match_stats.get("kills", 0),
+            match_stats.get("assists", 0),
+            match_stats.get("deaths", 0),
+            match_stats.get("mvps", 0),
+            match_stats.get("score", 0),
+            weapon,
+            ammo_clip,
+            ammo_reserve,
+            reloading,
+        )
+
+    @classmethod
+    def from_payload(cls, data: dict) -> "GameState":
+        """从 CS2 GSI 请求数据构建快照"""
+        return cls(*cls.fingerprint(data))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GameState 不可修改")
+
+    def __delattr__(self, name):
+        raise AttributeError("GameState 不可修改")
+
+    def __getitem__(self, name: str):
+        return getattr(self, name)
+
+    def get(self, name: str, default=None):
+        return getattr(self, name, default)
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return self._values == other._values
+
+    def __hash__(self):
+        return hash(self._values)
+
+    def __repr__(self):
+        return f"GameState({self.to_dict()})"
+
+    def diff(self, previous: "GameState") -> Tuple[str, ...]:
+        """返回相对 previous 发生变化的字段名
+
+        逐位置比较两个快照的构造参数（在 C 层完成），只为变化的位置生成字段名
+        """
+        changed = tuple(compress(self.ARGUMENT_FIELDS, map(ne, self._values, previous._values)))
+        if changed and changed[0] == "health" and self.is_alive != previous.is_alive:
+            changed += ("is_alive",)
+        return changed
+
+    def to_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.FIELDS}
@@ -0,0 +1,168 @@
+"""
+已触发事件的历史记录
+固定容量的环形缓冲区，各列在启动时一次性分配，写满后覆盖最旧的记录，长时间运行内存不增长；
+每条记录有递增的序号 seq，前端断线重连后用上次收到的 seq 作为游标补齐错过的事件；
+history_id 标识一段连续的序号，后端重启后会变化，前端据此判断序号是否从头开始
+
+多进程模式下主 worker 记录事件并经总线同步给其他 worker（insert / complete），各 worker 的缓冲区内容相同，
+主 worker 切换后新的主 worker 沿用同一个 history_id 继续编号
+"""
+
+import os
+import time
+from typing import List, Optional, Tuple
+
+
+# 指令发送结果
+PENDING = "pending"
+SUCCESS = "success"
+FAILED = "failed"
+PARTIAL = "partial"
+NO_COMMANDS = "no_commands"
+# 指令全部被同一玩家后续的相同指令取代（由后续事件送达）
+SUPERSEDED = "superseded"
+# 指令全部未发送（被取代或因等待过久被高优先级指令抢占）
+DROPPED = "dropped"
+
+
+class EventHistory:
+    """事件历史环形缓冲区
+
+    序号为 seq 的记录存放在 seq % capacity 的位置，按游标查询时可直接定位
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = max(1, capacity)
+        size = self.capacity
+        self._seq: List[int] = [0] * size
+        self._timestamp: List[float] = [0.0] * size
+        self._event_id: List[Optional[str]] = [None] * size
+        self._session: List[Optional[str]] = [None] * size
+        self._changes: List[Optional[dict]] = [None] * size
+        self._outcome: List[str] = [PENDING] * size
+        self._latency: List[Optional[float]] = [None] * size
+        # 最新一条记录的序号，0 表示还没有记录
+        self.last_seq = 0
+        self.history_id = os.urandom(6).hex()
+        # 本进程记录过事件，或已从主 worker 同步（单进程时始终为 True，由调用方设置）
+        self.synced = False
+
+    @property
+    def first_seq(self) -> int:
+        """缓冲区中最旧一条记录的序号"""
+        return max(1, self.last_seq - self.capacity + 1) if self.last_seq else 0
+
+    def __len__(self):
+        return min(self.last_seq, self.capacity)
+
+    def record(self, event_id: str, session_id: Optional[str], changes: dict,
+               timestamp: Optional[float] = None) -> int:
+        """追加一条记录（覆盖最旧的），返回其序号"""
+        self.synced = True
+        seq = self.last_seq + 1
+        self.insert(seq, timestamp or time.time(), event_id, session_id, changes)
+        return seq
+
+    def insert(self, seq: int, timestamp: float, event_id: str, session_id: Optional[str], changes: dict):
+        """按指定序号写入一条记录（同步主 worker 的记录时使用）"""
+        slot = seq % self.capacity
+        self._seq[slot] = seq
+        self._timestamp[slot] = timestamp
+        self._event_id[slot] = event_id
+        self._session[slot] = session_id
+        self._changes[slot] = changes
+        self._outcome[slot] = PENDING
+        self._latency[slot] = None
+        if seq > self.last_seq:
+            self.last_seq = seq
+
+    def adopt(self, history_id: str):
+        """改用主 worker 的 history_id；与本地不同时清空缓冲区"""
+        if history_id != self.history_id:
+            self._seq = [0] * self.capacity
+            self.last_seq = 0
+            self.history_id = history_id
+        self.synced = True
+
+    def complete(self, seq: int, outcome: str, latency: Optional[float] = None):
+        """记录指令发送结果；记录已被覆盖时忽略"""
+        slot = seq % self.capacity
+        if self._seq[slot] == seq:
+            self._outcome[slot] = outcome
+            self._latency[slot] = latency
+
+    def _entry(self, slot: int) -> dict:
+        latency = self._latency[slot]
+        return {
+            "seq": self._seq[slot],
+            "event_id": self._event_id[slot],
+            "steamid": self._session[slot],
+            "timestamp": self._timestamp[slot],
+            "changes": self._changes[slot],
+            "outcome": self._outcome[slot],
+            "latency_ms": round(latency * 1000, 3) if latency is not None else None,
+        }
+
+    def query(self, cursor: Optional[int] = None, since: Optional[float] = None,
+              event_id: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], dict]:
+        """按序号从旧到新返回记录
+
+        cursor: 只返回序号大于 cursor 的记录（上一页的 next_cursor）
+        since: 只返回该时间戳（秒）之后的记录
+        cursor 和 since 都未指定时返回最新的 limit 条
+        返回 (记录列表, 分页信息)
+        """
+        limit = max(1, min(limit, self.capacity))
+        first, last = self.first_seq, self.last_seq
+        if not last:
+            return [], {"next_cursor": cursor or 0, "has_more": False, "truncated": False,
+                        "first_seq": 0, "last_seq": 0, **self._lineage()}
+
+        if cursor is None and since is None:
+            # 最新的 limit 条：从新到旧扫描后翻转，之后用 next_cursor 继续取更新的记录
+            items: List[dict] = []
+            seq = last
+            while seq >= first and len(items) < limit:
+                slot = seq % self.capacity
+                # 同步时漏掉的序号对应的位置仍是旧记录，跳过
+                if self._seq[slot] == seq and (event_id is None or self._event_id[slot] == event_id):
+                    items.append(self._entry(slot))
+                seq -= 1
+            items.reverse()
+            return items, {"next_cursor": last, "has_more": False, "truncated": False,
+                           "first_seq": first, "last_seq": last, **self._lineage()}
+
+        truncated = False
+        start = first
+        if cursor is not None:
+            start = cursor + 1
+            # 游标之后的部分记录已被覆盖
+            if start < first:
+                truncated = True
+                start = first
+
+        items = []
+        seq = start
+        while seq <= last and len(items) < limit:
+            slot = seq % self.capacity
+            if self._seq[slot] == seq and (since is None or self._timestamp[slot] >= since) and \
+                    (event_id is None or self._event_id[slot] == event_id):
+                items.append(self._entry(slot))
+            seq += 1
+
+        # 下一页从本页扫描到的位置继续
+        return items, {
+            "next_cursor": seq - 1,
+            "has_more": seq <= last,
+            "truncated": truncated,
+            "first_seq": first,
+            "last_seq": last,
+            **self._lineage(),
+        }
+
+    def _lineage(self) -> dict:
+        return {"history_id": self.history_id, "synced": self.synced}
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "size": len(self), "last_seq": self.last_seq,
+                **self._lineage()}
@@ -0,0 +1,163 @@
+"""
+IM 服务 WebSocket 长连接通道
+与 IM 服务保持一条 WebSocket 连接，多条请求按请求 ID 复用这条连接，每条指令只需写一帧，
+不再有 HTTP 请求头和连接池调度的开销；断线后在后台自动重连，未连接期间 IMClient 改走 HTTP 接口
+
+帧格式（JSON 文本帧，与 HTTP 接口的路径和请求体一一对应）:
+- 请求 {"id": n, "path": "/api/send-command", "body": {"commandId": ...}}
+- 响应 {"id": n, "status": 200, "body": {...}}（响应可能乱序到达，按 id 匹配）
+"""
+
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+import json_codec
+from structured_log import get_logger
+
+
+log = get_logger("im_channel")
+
+WS_PATH = "/ws/commands"
+
+
+class ChannelUnavailable(Exception):
+    """通道未连接，请求没有发出（可以改走 HTTP）"""
+
+
+class ChannelClosed(Exception):
+    """请求已发出但连接在响应前断开（指令可能已被处理）"""
+
+
+def channel_url(base_url: str) -> str:
+    """由 IM 服务的 HTTP 地址得到 WebSocket 通道地址"""
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://"):] + WS_PATH
+    if base_url.startswith("http://"):
+        return "ws://" + base_url[len("http://"):] + WS_PATH
+    return base_url + WS_PATH
+
+
+class IMChannel:
+    """到 IM 服务的 WebSocket 长连接
+
+    heartbeat: WebSocket ping 间隔（秒），用于及时发现断开的连接
+    """
+
+    def __init__(self, url: str, heartbeat: float = 10.0):
+        self.url = url
+        self.heartbeat = heartbeat
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._failures = 0
+        self.connects = 0
+        self.requests = 0
+        self.disconnected_requests = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    async def start(self):
+        """在后台建立连接，最多等待 1 秒（连不上时先走 HTTP）"""
+        if self._task is not None:
+            return
+        self._session = aiohttp.ClientSession()
+        connected = asyncio.Event()
+        self._task = asyncio.create_task(self._run(connected), name="im-channel")
+        try:
+            await asyncio.wait_for(connected.wait(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _run(self, connected: asyncio.Event):
+        delay = 0.2
+        while True:
+            try:
+                ws = await self._session.ws_connect(self.url, heartbeat=self.heartbeat, autoping=True)
+            except (aiohttp.ClientError, OSError) as e:
+                # 只在首次失败时记录，避免 IM 服务未启动时每次重连都输出
+                if self._failures == 0:
+                    log.warning("✗ 无法连接 IM 服务的 WebSocket 通道，暂时使用 HTTP", url=self.url, error=e)
+                self._failures += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+
+            delay = 0.2
+            self._failures = 0
+            self._ws = ws
+            self.connects += 1
+            connected.set()
+            log.info("✓ 已连接 IM 服务的 WebSocket 通道", url=self.url)
+            try:
+                async for message in ws:
+                    if message.type == aiohttp.WSMsgType.TEXT:
+                        self._on_reply(message.data)
+                    elif message.type == aiohttp.WSMsgType.ERROR:
+                        break
+            finally:
+                self._ws = None
+                await ws.close()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ChannelClosed("IM 服务的 WebSocket 连接已断开"))
+                self._pending.clear()
+            log.warning("✗ IM 服务的 WebSocket 通道断开，正在重连", url=self.url)
+
+    def _on_reply(self, data: str):
+        try:
+            reply = json_codec.loads(data)
+            future = self._pending.pop(reply["id"], None)
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning("✗ 无法解析 IM 服务的响应帧", error=e)
+            return
+        if future is not None and not future.done():
+            future.set_result((int(reply.get("status", 500)), reply.get("body") or {}))
+
+    async def request(self, path: str, body: dict, timeout: float) -> Tuple[int, dict]:
+        """发送一个请求并等待响应，返回 (状态码, 响应体)
+
+        未连接时抛出 ChannelUnavailable，超时抛出 asyncio.TimeoutError，连接中途断开抛出 ChannelClosed
+        """
+        ws = self._ws
+        if ws is None or ws.closed:
+            self.disconnected_requests += 1
+            raise ChannelUnavailable("IM 服务的 WebSocket 通道未连接")
+
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.requests += 1
+        try:
+            try:
+                await ws.send_str(json_codec.dumps({"id": request_id, "path": path, "body": body}))
+            except (ConnectionError, RuntimeError) as e:
+                raise ChannelUnavailable(f"写入 WebSocket 通道失败: {e}")
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "connects": self.connects,
+            "requests": self.requests,
+            "pending": len(self._pending),
+            "fallbacks": self.disconnected_requests,
+        }
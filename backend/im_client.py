@@ -0,0 +1,269 @@
+"""
+IM 服务 HTTP 客户端
+在应用生命周期内复用同一个 aiohttp 会话与 keep-alive 连接池；
+请求经过熔断器，IM 服务不可用时快速失败，并通过 /health 探测恢复；
+transport 为 "ws" 时优先通过 WebSocket 长连接发送（见 im_channel.py），通道未连接时改走 HTTP
+"""
+
+import asyncio
+import time
+from typing import List, Optional
+
+import aiohttp
+
+from circuit_breaker import CircuitBreaker, RetryBudget, backoff_delay
+from im_channel import ChannelClosed, ChannelUnavailable, IMChannel, channel_url
+from metrics import metrics
+
+
+IM_SERVICE_URL = "http://localhost:3001"
+
+
+class BatchNotSupported(Exception):
+    """IM 服务没有批量发送接口（旧版本）"""
+
+
+class IMUnavailable(Exception):
+    """熔断器打开，IM 服务暂不可用"""
+
+
+class _Retryable(Exception):
+    """请求未被 IM 服务处理（连接失败或 IM 未就绪），可以安全重试"""
+
+    def __init__(self, message: str, result: Optional[dict] = None):
+        super().__init__(message)
+        self.result = result
+
+
+class _ServerError(Exception):
+    """IM 服务返回 5xx，计入熔断但不重试（指令可能已部分处理）"""
+
+    def __init__(self, result: dict):
+        super().__init__(result.get("message", "IM 服务错误"))
+        self.result = result
+
+
+class IMClient:
+    """调用 Node.js IM 服务的长连接客户端
+
+    max_retries: 指令未送达 IM 服务时的最大重试次数（只重试连接失败和 503，不会重复发送已处理的指令）
+    probe_interval: 健康检查间隔（秒），0 表示不检查
+    transport: "http" 每条请求走 HTTP；"ws" 优先使用 WebSocket 长连接，未连接时改走 HTTP
+    """
+
+    def __init__(self, base_url: str = IM_SERVICE_URL, pool_size: int = 4,
+                 keepalive_timeout: float = 30.0, timeout: float = 5.0,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = 2,
+                 retry_budget: Optional[RetryBudget] = None, probe_interval: float = 5.0,
+                 transport: str = "http"):
+        if transport not in ("http", "ws"):
+            raise ValueError(f"未知的 IM 传输方式: {transport}")
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget or RetryBudget()
+        self.probe_interval = probe_interval
+        self.transport = transport
+        self.channel: Optional[IMChannel] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        # 连接复用统计
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        # 最近一次健康检查结果
+        self.service_up: Optional[bool] = None
+        self.im_ready: Optional[bool] = None
+
+    async def start(self):
+        """创建会话和连接池，启动健康检查（应用启动时调用）"""
+        if self._session is None or self._session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_create)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[trace_config],
+            )
+
+        if self.transport == "ws" and self.channel is None:
+            # 地址在启动时确定（回放工具会在启动前修改 base_url）
+            self.channel = IMChannel(channel_url(self.base_url))
+            await self.channel.start()
+
+        if self.probe_interval > 0 and self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop(), name="im-health-probe")
+
+    async def close(self):
+        """停止健康检查并关闭会话（应用退出时调用）"""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+        if self.channel is not None:
+            await self.channel.close()
+            self.channel = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _on_connection_create(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self.connections_reused += 1
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.probe_interval)
+
+    async def probe(self) -> bool:
+        """请求 IM 服务的 /health，服务正常且 IM 就绪时让熔断器进入试探状态"""
+        try:
+            async with self._session.get(
+                f"{self.base_url}/health",
+                timeout=aiohttp.ClientTimeout(total=min(self.timeout, 2.0))
+            ) as response:
+                result = await response.json()
+            self.service_up = True
+            self.im_ready = bool(result.get("imReady"))
+        except Exception:
+            self.service_up = False
+            self.im_ready = False
+
+        if self.im_ready:
+            self.breaker.probe_succeeded()
+        return bool(self.im_ready)
+
+    async def _post(self, path: str, payload: dict, batch: bool = False) -> dict:
+        """经过熔断器发送请求，未送达时按重试预算做带抖动的有限重试"""
+        if self._session is None or self._session.closed:
+            await self.start()
+
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise IMUnavailable("IM 服务不可用（熔断中）")
+
+            self.requests += 1
+            try:
+                result = await self._post_once(path, payload, batch)
+                self.breaker.record_success()
+                return result
+            except BatchNotSupported:
+                self.breaker.record_success()
+                raise
+            except _ServerError as e:
+                self.breaker.record_failure()
+                return e.result
+            except _Retryable as e:
+                self.breaker.record_failure()
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError, ChannelClosed):
+                # 请求可能已被处理，不重试
+                self.breaker.record_failure()
+                raise
+            except asyncio.CancelledError:
+                self.breaker.release_trial()
+                raise
+            except Exception:
+                # 其他意外错误同样计为失败，保证熔断器的试探名额被释放
+                self.breaker.record_failure()
+                raise
+
+            if attempt >= self.max_retries or not self.retry_budget.withdraw():
+                if error.result is not None:
+                    return error.result
+                raise IMUnavailable(str(error))
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def _post_once(self, path: str, payload: dict, batch: bool) -> dict:
+        started_at = time.perf_counter()
+        status = None
+        if self.channel is not None:
+            try:
+                status, result = await self.channel.request(path, payload, self.timeout)
+            except ChannelUnavailable:
+                pass
+            else:
+                if batch and status in (404, 405):
+                    raise BatchNotSupported()
+        # 未使用或未连接 WebSocket 通道时走 HTTP
+        if status is None:
+            try:
+                async with self._session.post(f"{self.base_url}{path}", json=payload) as response:
+                    status = response.status
+                    if batch and status in (404, 405):
+                        raise BatchNotSupported()
+                    try:
+                        result = await response.json(content_type=None)
+                    except ValueError:
+                        # 例如反向代理返回的 HTML 错误页
+                        result = None
+            except aiohttp.ClientConnectorError as e:
+                raise _Retryable(f"无法连接 IM 服务: {e}")
+
+        if not isinstance(result, dict):
+            result = {"success": False, "message": f"IM 服务返回了无法解析的响应 (HTTP {status})"}
+
+        metrics.observe("im_roundtrip", time.perf_counter() - started_at)
+        if status == 503:
+            raise _Retryable(result.get("message", "IM 未就绪"), result)
+        if status >= 500:
+            raise _ServerError(result)
+        return result
+
+    async def send_command(self, command_id: str) -> dict:
+        """发送单条指令，返回 IM 服务的响应 JSON"""
+        return await self._post("/api/send-command", {"commandId": command_id})
+
+    async def send_commands(self, command_ids: List[str]) -> List[dict]:
+        """批量发送指令，按顺序返回每条指令的结果
+
+        IM 服务不支持批量接口时抛出 BatchNotSupported
+        """
+        result = await self._post(
+            "/api/send-commands",
+            {"commands": [{"commandId": command_id} for command_id in command_ids]},
+            batch=True
+        )
+        results = result.get("results")
+        if not isinstance(results, list) or len(results) != len(command_ids):
+            message = result.get("message", "批量发送返回格式错误")
+            return [{"success": False, "message": message} for _ in command_ids]
+        return results
+
+    def stats(self) -> dict:
+        """连接复用统计"""
+        total = self.connections_created + self.connections_reused
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": round(self.connections_reused / total, 3) if total else 0.0,
+            "pool_size": self.pool_size,
+            "transport": self.transport,
+            "channel": self.channel.stats() if self.channel is not None else None,
+        }
+
+    def health(self) -> dict:
+        """IM 服务可用性：熔断器状态、重试预算与最近一次健康检查结果"""
+        return {
+            "service_up": self.service_up,
+            "im_ready": self.im_ready,
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.retry_budget.stats(),
+        }
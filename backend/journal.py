@@ -0,0 +1,475 @@
+"""
+对局日志
+把每个 tick 的状态变化、触发的事件和指令发送结果追加写入分段的二进制文件，供赛后分析
+
+- 热路径只把记录放入内存队列（一次 deque.append），编码和写文件都在后台线程完成
+- 状态只记录变化的字段：每个分段中同一玩家的第一条为完整快照，之后为 [字段序号, 新值, ...] 增量，
+  因此每个分段都可以单独解析
+- 分段按大小或时间轮转，超出数量上限时删除最旧的分段
+- 读取时用 mmap 映射整个分段，按长度前缀跳读，只解码需要的记录类型
+
+文件格式（小端序）:
+    文件头  b"CS2J" | 版本 u8 | 头部长度 u32 | 头部 JSON {"fields": [...], "created": 时间戳, "pid": 进程号,
+                                                         "sequence": 分段序号}
+    记录    长度 u32 | 类型 u8 | 时间戳 f64 | 内容 JSON（长度为前面的“长度”字段）
+
+记录内容:
+    SNAPSHOT [steamid, [字段值...]]          字段顺序见文件头的 fields
+    DIFF     [steamid, [序号, 新值, ...]]
+    EVENT    [seq, steamid, event_id, [指令 ID...]]   seq 与 /api/history 中的序号相同
+    OUTCOME  [seq, 结果, 耗时毫秒]
+
+用法:
+    python journal.py info ../journal
+    python journal.py export ../journal -o match.jsonl
+    python journal.py export ../journal/20261018-201500-123-p4242-000001.cs2j --type event,outcome
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import json_codec
+from game_state import GameState
+from structured_log import get_logger
+
+
+log = get_logger("journal")
+
+MAGIC = b"CS2J"
+VERSION = 1
+SUFFIX = ".cs2j"
+
+_FILE_HEADER = struct.Struct("<4sBI")
+_RECORD_HEADER = struct.Struct("<IBd")
+
+# 记录类型
+SNAPSHOT = 1
+DIFF = 2
+EVENT = 3
+OUTCOME = 4
+
+TYPE_NAMES = {SNAPSHOT: "snapshot", DIFF: "diff", EVENT: "event", OUTCOME: "outcome"}
+
+# 队列中的状态记录，由写入线程与该玩家上一次写出的状态比较后决定写快照还是增量
+_STATE = 0
+
+
+class JournalError(Exception):
+    """不是对局日志文件或文件头损坏"""
+
+
+class JournalWriter:
+    """后台线程写入的对局日志
+
+    directory: 分段文件所在目录
+    max_bytes / max_age: 当前分段超过该大小（字节）或时长（秒）后轮转，0 表示不按该条件轮转
+    max_segments: 最多保留的分段数，超出时删除最旧的，0 表示不删除
+    queue_size: 等待写入的最大记录数，磁盘跟不上时丢弃新记录
+    flush_interval: 写入线程的轮询间隔（秒），也是异常退出时最多丢失的时长
+    """
+
+    def __init__(self, directory, enabled: bool = True, max_bytes: int = 16 * 1024 * 1024,
+                 max_age: float = 3600.0, max_segments: int = 48, queue_size: int = 100000,
+                 flush_interval: float = 0.5):
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_segments = max_segments
+        self.queue_size = max(1, queue_size)
+        self.flush_interval = flush_interval
+        self._queue: deque = deque()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 以下只在写入线程中访问
+        self._file = None
+        self._path: Optional[Path] = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._segment_seq = 0
+        self._last: Dict[str, tuple] = {}
+
+        self.records = 0
+        self.bytes = 0
+        self.segments = 0
+        self.dropped = 0
+        self.errors = 0
+
+    # ---- 热路径（事件循环中调用） ----
+
+    def _put(self, item: tuple):
+        if len(self._queue) >= self.queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(item)
+
+    def append_state(self, session_id: str, fingerprint: tuple):
+        """记录玩家的新状态（GameState 构造参数）"""
+        self._put((_STATE, time.time(), session_id, fingerprint))
+
+    def append_event(self, seq: int, session_id: Optional[str], event_id: str, commands: List[str]):
+        """记录进入分发的事件及其要发送的指令"""
+        self._put((EVENT, time.time(), [seq, session_id, event_id, commands]))
+
+    def append_outcome(self, seq: int, outcome: str, latency: Optional[float] = None):
+        """记录事件指令的发送结果"""
+        latency_ms = round(latency * 1000, 3) if latency is not None else None
+        self._put((OUTCOME, time.time(), [seq, outcome, latency_ms]))
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+        log.info("✓ 对局日志已启用", directory=str(self.directory))
+
+    def close(self):
+        """写完队列中剩余的记录后关闭当前分段（阻塞）"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    # ---- 写入线程 ----
+
+    def _run(self):
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            try:
+                self._drain()
+            except OSError as e:
+                self.errors += 1
+                log.error("✗ 写入对局日志失败，丢弃本批记录", path=str(self._path), error=e)
+                self._queue.clear()
+                self._close_segment()
+            if stopping:
+                self._close_segment()
+                return
+
+    def _drain(self):
+        queue = self._queue
+        if not queue:
+            # 空闲时也按时间轮转，避免一个分段跨越很长时间
+            if self._file is not None and self.max_age and time.time() - self._opened_at >= self.max_age:
+                self._close_segment()
+            return
+
+        chunks = []
+        size = 0
+        while queue:
+            item = queue.popleft()
+            timestamp = item[1]
+            if self._file is None:
+                self._open_segment(timestamp)
+            elif (self.max_bytes and self._size + size >= self.max_bytes) or \
+                    (self.max_age and timestamp - self._opened_at >= self.max_age):
+                self._write(chunks, size)
+                chunks, size = [], 0
+                self._close_segment()
+                self._open_segment(timestamp)
+
+            if item[0] == _STATE:
+                record_type, body = self._state_record(item[2], item[3])
+            else:
+                record_type, body = item[0], item[2]
+            payload = json_codec.dumps_bytes(body)
+            chunks.append(_RECORD_HEADER.pack(len(payload), record_type, timestamp))
+            chunks.append(payload)
+            size += _RECORD_HEADER.size + len(payload)
+            self.records += 1
+        self._write(chunks, size)
+
+    def _state_record(self, session_id: str, fingerprint: tuple) -> Tuple[int, list]:
+        previous = self._last.get(session_id)
+        self._last[session_id] = fingerprint
+        if previous is None or len(previous) != len(fingerprint):
+            return SNAPSHOT, [session_id, list(fingerprint)]
+        changes = []
+        for index, (old, new) in enumerate(zip(previous, fingerprint)):
+            if old != new:
+                changes.append(index)
+                changes.append(new)
+        return DIFF, [session_id, changes]
+
+    def _write(self, chunks: List[bytes], size: int):
+        if not chunks:
+            return
+        self._file.write(b"".join(chunks))
+        self._file.flush()
+        self._size += size
+        self.bytes += size
+
+    def _open_segment(self, timestamp: float):
+        # 文件名: 创建时间（到毫秒）-进程号-本进程内递增的分段序号（定宽），按文件名排序即按创建顺序
+        prefix = time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp))
+        prefix += f"-{int(timestamp * 1000) % 1000:03d}-p{os.getpid()}"
+        while True:
+            self._segment_seq += 1
+            path = self.directory / f"{prefix}-{self._segment_seq:06d}{SUFFIX}"
+            try:
+                file = open(path, "xb")
+                break
+            except FileExistsError:
+                continue
+
+        header = json_codec.dumps_bytes({
+            "fields": list(GameState.ARGUMENT_FIELDS),
+            "created": timestamp,
+            "pid": os.getpid(),
+            "sequence": self._segment_seq,
+        })
+        self._file = file
+        self._file.write(_FILE_HEADER.pack(MAGIC, VERSION, len(header)) + header)
+        self._path = path
+        self._opened_at = timestamp
+        self._size = _FILE_HEADER.size + len(header)
+        # 新分段从完整快照开始
+        self._last.clear()
+        self.segments += 1
+        self._remove_old_segments()
+
+    def _close_segment(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = None
+
+    def _remove_old_segments(self):
+        if not self.max_segments:
+            return
+        for path in list_segments(self.directory)[:-self.max_segments]:
+            # 当前正在写入的分段不删除
+            if path == self._path:
+                continue
+            try:
+                path.unlink()
+            except OSError as e:
+                log.warning("✗ 无法删除旧的对局日志分段", path=str(path), error=e)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory),
+            "segment": self._path.name if self._path else None,
+            "segments": self.segments,
+            "records": self.records,
+            "bytes": self.bytes,
+            "queued": len(self._queue),
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+def list_segments(directory) -> List[Path]:
+    """目录中的分段文件，按创建顺序排序（文件名以创建时间开头，同一毫秒内按定宽的分段序号区分）"""
+    return sorted(Path(directory).glob("*" + SUFFIX))
+
+
+class JournalReader:
+    """用 mmap 读取单个分段
+
+    文件末尾不完整的记录（写入中途进程退出）会被忽略，truncated 为 True
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.truncated = False
+        self._file = open(self.path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _FILE_HEADER.size:
+                raise JournalError(f"{self.path.name}: 文件过短")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, header_size = _FILE_HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise JournalError(f"{self.path.name}: 不是对局日志文件")
+            if version != VERSION:
+                raise JournalError(f"{self.path.name}: 不支持的版本 {version}")
+            self._start = _FILE_HEADER.size + header_size
+            try:
+                self.header = json_codec.loads(self._map[_FILE_HEADER.size:self._start])
+            except ValueError:
+                raise JournalError(f"{self.path.name}: 文件头损坏")
+        except BaseException:
+            self.close()
+            raise
+        self.fields: List[str] = self.header.get("fields", [])
+
+    def headers(self) -> Iterator[Tuple[int, float, int, int]]:
+        """只遍历记录头，返回 (类型, 时间戳, 内容偏移, 内容长度)"""
+        data = self._map
+        end = len(data)
+        offset = self._start
+        unpack = _RECORD_HEADER.unpack_from
+        header_size = _RECORD_HEADER.size
+        while offset + header_size <= end:
+            length, record_type, timestamp = unpack(data, offset)
+            body_start = offset + header_size
+            offset = body_start + length
+            if offset > end:
+                break
+            yield record_type, timestamp, body_start, length
+        self.truncated = offset != end
+
+    def records(self, types: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, float, object]]:
+        """按写入顺序返回 (类型, 时间戳, 内容)；指定 types 时其他类型的记录不解码"""
+        wanted = set(types) if types is not None else None
+        data = self._map
+        loads = json_codec.loads
+        for record_type, timestamp, start, length in self.headers():
+            if wanted is None or record_type in wanted:
+                yield record_type, timestamp, loads(data[start:start + length])
+
+    def close(self):
+        data = getattr(self, "_map", None)
+        if data is not None:
+            data.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def expand_paths(paths: Sequence[str]) -> List[Path]:
+    """命令行参数中的目录展开为其中的分段文件"""
+    result = []
+    for path in map(Path, paths):
+        result.extend(list_segments(path) if path.is_dir() else [path])
+    return result
+
+
+def export_records(paths: Sequence[Path], types: Optional[set] = None,
+                   steamid: Optional[str] = None) -> Iterator[dict]:
+    """把分段还原为 JSON 对象：状态记录还原为完整状态，并附带本条变化的字段"""
+    want_state = types is None or "state" in types
+    record_types = set()
+    if want_state:
+        record_types.update((SNAPSHOT, DIFF))
+    for name, record_type in (("event", EVENT), ("outcome", OUTCOME)):
+        if types is None or name in types:
+            record_types.add(record_type)
+
+    for path in paths:
+        with JournalReader(path) as reader:
+            fields = reader.fields
+            states: Dict[str, list] = {}
+            for record_type, timestamp, body in reader.records(record_types):
+                if record_type == SNAPSHOT or record_type == DIFF:
+                    session_id, values = body
+                    if steamid is not None and session_id != steamid:
+                        continue
+                    if record_type == SNAPSHOT:
+                        state = states[session_id] = list(values)
+                        changes = dict(zip(fields, values))
+                    else:
+                        state = states.get(session_id)
+                        if state is None:
+                            continue
+                        changes = {}
+                        for i in range(0, len(values), 2):
+                            index, value = values[i], values[i + 1]
+                            state[index] = value
+                            changes[fields[index]] = value
+                    yield {"type": "state", "time": timestamp, "steamid": session_id,
+                           "changes": changes, "state": dict(zip(fields, state))}
+                elif record_type == EVENT:
+                    seq, session_id, event_id, commands = body
+                    if steamid is not None and session_id != steamid:
+                        continue
+                    yield {"type": "event", "time": timestamp, "seq": seq, "steamid": session_id,
+                           "event_id": event_id, "commands": commands}
+                else:
+                    seq, outcome, latency_ms = body
+                    yield {"type": "outcome", "time": timestamp, "seq": seq,
+                           "outcome": outcome, "latency_ms": latency_ms}
+            if reader.truncated:
+                print(f"⚠ {path.name}: 末尾记录不完整，已忽略", file=sys.stderr)
+
+
+def command_export(args):
+    types = set(args.type.split(",")) if args.type else None
+    paths = expand_paths(args.paths)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    count = 0
+    try:
+        for item in export_records(paths, types, args.steamid):
+            output.write(json_codec.dumps(item))
+            output.write("\n")
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"导出 {count} 条记录（{len(paths)} 个分段）", file=sys.stderr)
+
+
+def command_info(args):
+    total_records, total_bytes = 0, 0
+    start = time.perf_counter()
+    for path in expand_paths(args.paths):
+        counts = dict.fromkeys(TYPE_NAMES, 0)
+        first = last = None
+        with JournalReader(path) as reader:
+            # 只读记录头，不解码内容
+            for record_type, timestamp, _, _ in reader.headers():
+                counts[record_type] = counts.get(record_type, 0) + 1
+                first = timestamp if first is None else first
+                last = timestamp
+            truncated = reader.truncated
+        size = path.stat().st_size
+        records = sum(counts.values())
+        total_records += records
+        total_bytes += size
+        span = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first))} ~ " \
+               f"{time.strftime('%H:%M:%S', time.localtime(last))}" if first is not None else "-"
+        detail = " ".join(f"{TYPE_NAMES.get(t, t)}={n}" for t, n in counts.items() if n)
+        print(f"{path.name}  {size / 1024:.1f} KB  {records} 条  {span}  {detail}"
+              + ("  (末尾不完整)" if truncated else ""))
+    elapsed = time.perf_counter() - start
+    print(f"合计 {total_records} 条记录，{total_bytes / 1024 / 1024:.2f} MB，扫描耗时 {elapsed * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对局日志工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="导出为 JSON Lines")
+    export_parser.add_argument("paths", nargs="+", help="分段文件或所在目录")
+    export_parser.add_argument("-o", "--output", help="输出文件，默认输出到标准输出")
+    export_parser.add_argument("--type", help="只导出指定类型，逗号分隔: state,event,outcome")
+    export_parser.add_argument("--steamid", help="只导出指定玩家")
+    export_parser.set_defaults(func=command_export)
+
+    info_parser = commands.add_parser("info", help="列出各分段的记录数和时间范围")
+    info_parser.add_argument("paths", nargs="+", help="分段文件或所在目录")
+    info_parser.set_defaults(func=command_info)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except (JournalError, OSError) as e:
+        print(f"✗ {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
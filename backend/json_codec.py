@@ -0,0 +1,55 @@
+"""
+JSON 编解码
+优先使用已安装的 orjson / msgspec，未安装时回退到标准库 json
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _std_loads(data):
+    return json.loads(data)
+
+
+def _std_dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+    loads = orjson.loads
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+    loads = _decoder.decode
+
+    def dumps(obj) -> str:
+        return _encoder.encode(obj).decode("utf-8")
+
+    def dumps_bytes(obj) -> bytes:
+        return _encoder.encode(obj)
+
+else:
+    BACKEND = "json"
+    loads = _std_loads
+    dumps = _std_dumps
+
+    def dumps_bytes(obj) -> bytes:
+        return _std_dumps(obj).encode("utf-8")
@@ -1,8 +1,12 @@
+import asyncio
+import multiprocessing
 import socket
+import threading
 
 import uvicorn
 
-from app import app as fastapi_app
+from app import app as fastapi_app, app_settings
+from bus_broker import serve as serve_bus_broker
 
 
 def get_ip_address():
@@ -38,10 +42,32 @@ def main():
     print("=" * 60)
 
     # 启动 FastAPI
-    uvicorn.run(fastapi_app, host="0.0.0.0", port=8001)
+    cluster = app_settings["cluster"]
+    workers = cluster["workers"]
+    if workers > 1 and not cluster["bus"]:
+        print("⚠ 多进程模式需要配置 cluster.bus，已改为单进程运行")
+        workers = 1
+
+    if workers > 1:
+        if cluster["embedded_broker"] and cluster["bus"].startswith(("tcp://", "unix://")):
+            threading.Thread(target=run_bus_broker, args=(cluster["bus"],), daemon=True).start()
+        print(f"多进程模式: {workers} 个 worker，总线 {cluster['bus']}")
+        uvicorn.run("app:app", host="0.0.0.0", port=8001, workers=workers)
+    else:
+        uvicorn.run(fastapi_app, host="0.0.0.0", port=8001)
+
+
+def run_bus_broker(url: str):
+    """在后台线程中运行总线中转服务（地址已被占用时使用已有的服务）"""
+    try:
+        asyncio.run(serve_bus_broker(url))
+    except OSError as e:
+        print(f"总线中转服务未启动（{e}），将连接已有的服务")
 
 
 if __name__ == "__main__":
+    # 打包后以多进程模式运行时需要
+    multiprocessing.freeze_support()
     try:
         main()
     except KeyboardInterrupt:
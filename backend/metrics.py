@@ -0,0 +1,118 @@
+"""
+延迟统计
+各处理阶段的耗时记录到固定桶的直方图中，提供 p50/p95/p99 和 Prometheus 文本格式；
+关闭时 observe 直接返回，几乎没有开销
+
+阶段:
+- parse: 读取并解析 GSI 请求体
+- diff: 构建状态快照并比较变化字段
+- trigger: 触发条件计算与入队
+- queue_wait: 事件在分发队列中的等待时间
+- command_wait: 指令在发送队列中的等待时间
+- im_roundtrip: 一次 IM 服务请求的往返时间
+- ws_fanout: 事件编码并放入各 WebSocket 发送队列
+- ws_send_delay: 消息入队到实际写入 WebSocket 的时间
+- end_to_end: 收到 GSI 请求到 IM 服务确认指令
+"""
+
+import bisect
+import time
+from typing import Dict, List
+
+
+# 1µs 起按 √2 倍递增到约 12 秒：解析、比较、触发计算只有几到几十微秒，桶太粗时各分位数都落在同一个桶里
+BUCKETS: List[float] = [1e-6 * 2 ** (i / 2) for i in range(48)]
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """按桶线性插值估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                fraction = (rank - cumulative) / bucket_count
+                return min(lower + (upper - lower) * fraction, self.max)
+            cumulative += bucket_count
+        return self.max
+
+
+class Metrics:
+    """按阶段名称组织的直方图集合"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def reset(self):
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def to_dict(self) -> dict:
+        """JSON 格式，单位毫秒"""
+        stages = {}
+        for stage, h in self.histograms.items():
+            stages[stage] = {
+                "count": h.count,
+                "avg_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                "p50_ms": round(h.quantile(0.5) * 1000, 3),
+                "p95_ms": round(h.quantile(0.95) * 1000, 3),
+                "p99_ms": round(h.quantile(0.99) * 1000, 3),
+                "max_ms": round(h.max * 1000, 3),
+            }
+        return {
+            "enabled": self.enabled,
+            "since": self.started_at,
+            "stages": stages,
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式，单位秒"""
+        name = "cs2_ycy_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Latency of each processing stage from GSI receipt to IM acknowledgment.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, h in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, h.counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+
+# 全局实例，由 app.py 根据 settings.json 开关
+metrics = Metrics()
@@ -0,0 +1,257 @@
+"""
+GSI 录制回放与吞吐基准
+按录制时的节奏（或 N 倍速、或不等待）把 GSI 请求体依次发送给后端，统计吞吐、触发次数和延迟分布，
+作为性能改动的回归基准
+
+录制文件由 test_cs2_connect.py --record 生成，每行 {"t": 秒, "body": 请求体}，.gz 结尾时为 gzip 压缩；
+每行一个原始请求体的文件也可以直接使用（没有时间信息，按最大速度回放）
+
+用法:
+    python replay_gsi.py match.jsonl.gz                  # 进程内回放，按原始节奏
+    python replay_gsi.py match.jsonl.gz --speed 4        # 4 倍速
+    python replay_gsi.py match.jsonl.gz --speed 0        # 不等待，测最大吞吐
+    python replay_gsi.py match.jsonl.gz --url http://localhost:8000   # 回放到运行中的后端
+    python replay_gsi.py match.jsonl.gz --im-url http://localhost:3101 -o report.json
+    python replay_gsi.py match.jsonl.gz --stub --stub-latency lognormal:20,0.6 --stub-error-rate 0.05
+    python replay_gsi.py match.jsonl.gz --stub --im-transport ws   # 对比 WebSocket 通道与 HTTP
+
+进程内回放会使用项目根目录的 settings.json 和 event_configs.json；
+指令发往 --im-url（默认为 settings.json 中的 im.url），建议指向本地的 IM 测试服务；
+--stub 时在同一进程内启动 stub_im_service.py 并把指令发往它
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import time
+from typing import List, Optional, Tuple
+
+import json_codec
+
+
+def read_records(path: str) -> List[Tuple[float, bytes]]:
+    """读取录制文件，返回 [(相对时间, 请求体)]"""
+    opener = gzip.open if path.endswith(".gz") else open
+    records = []
+    with opener(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json_codec.loads(line)
+            if isinstance(item, dict) and "body" in item and "provider" not in item:
+                records.append((float(item.get("t", 0.0)), json_codec.dumps_bytes(item["body"])))
+            else:
+                records.append((0.0, line))
+    return records
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize_latency(values: List[float]) -> dict:
+    """请求延迟分布，单位毫秒"""
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "avg_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+async def replay(client, records: List[Tuple[float, bytes]], speed: float, loops: int) -> dict:
+    """依次发送请求体，speed <= 0 时不等待"""
+    latencies: List[float] = []
+    errors = 0
+    headers = {"Content-Type": "application/json"}
+    first_t = records[0][0]
+
+    started_at = time.perf_counter()
+    for loop in range(loops):
+        loop_started_at = time.perf_counter()
+        for t, body in records:
+            if speed > 0:
+                delay = loop_started_at + (t - first_t) / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            sent_at = time.perf_counter()
+            response = await client.post("/api/cs2-event", content=body, headers=headers)
+            latencies.append(time.perf_counter() - sent_at)
+            if response.status_code != 200 or response.json().get("status") == "error":
+                errors += 1
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "ticks": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "ticks_per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "request_latency": summarize_latency(latencies),
+    }
+
+
+async def wait_drained(client, timeout: float) -> dict:
+    """等待分发队列清空、所有指令都有结果，返回最终的 /api/health"""
+    deadline = time.monotonic() + timeout
+    while True:
+        health = (await client.get("/api/health")).json()
+        commands = health["im_commands"]
+        settled = (commands["succeeded"] + commands["failed"]
+                   + commands["superseded"] + commands["preempted"])
+        if (health["dispatch"]["queue_size"] == 0 and settled >= commands["submitted"]) \
+                or time.monotonic() >= deadline:
+            return health
+        await asyncio.sleep(0.05)
+
+
+async def run(client, records: List[Tuple[float, bytes]], args) -> dict:
+    before = (await client.get("/api/gsi-stats")).json()
+    await client.delete("/api/metrics")
+
+    report = await replay(client, records, args.speed, args.loops)
+    health = await wait_drained(client, args.drain_timeout)
+    after = (await client.get("/api/gsi-stats")).json()
+
+    report["triggered"] = {
+        event_id: count - before.get("triggered", {}).get(event_id, 0)
+        for event_id, count in after.get("triggered", {}).items()
+        if count != before.get("triggered", {}).get(event_id, 0)
+    }
+    report["gsi"] = {key: after[key] - before.get(key, 0) for key in ("processed", "skipped", "ignored")}
+    report["dispatch"] = health["dispatch"]
+    report["im_commands"] = {key: health["im_commands"][key]
+                             for key in ("submitted", "succeeded", "failed", "superseded", "preempted")}
+    report["stages"] = (await client.get("/api/metrics")).json().get("stages", {})
+    return report
+
+
+async def run_in_process(records: List[Tuple[float, bytes]], args) -> dict:
+    """在当前进程内启动后端应用，通过 ASGI 直接调用（不经过网络）"""
+    import httpx
+
+    # 应用在导入时会打印配置信息，--quiet 时一并屏蔽
+    quiet = contextlib.redirect_stdout(io.StringIO()) if args.quiet else contextlib.nullcontext()
+    with quiet:
+        import app as backend
+
+        stub = None
+        if args.stub:
+            from stub_im_service import StubIMService
+
+            stub = StubIMService(latency=args.stub_latency, error_rate=args.stub_error_rate,
+                                 concurrency=args.stub_concurrency)
+            await stub.start("127.0.0.1", args.stub_port)
+            backend.im_client.base_url = f"http://127.0.0.1:{args.stub_port}"
+        elif args.im_url:
+            backend.im_client.base_url = args.im_url.rstrip("/")
+        if args.im_transport:
+            backend.im_client.transport = args.im_transport
+
+        try:
+            async with backend.app.router.lifespan_context(backend.app):
+                transport = httpx.ASGITransport(app=backend.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+                    report = await run(client, records, args)
+        finally:
+            if stub is not None:
+                await stub.stop()
+
+    if stub is not None:
+        stub_stats = stub.stats()
+        del stub_stats["command_counts"]
+        report["stub_im"] = stub_stats
+    return report
+
+
+async def run_over_http(records: List[Tuple[float, bytes]], args) -> dict:
+    """回放到已运行的后端"""
+    import httpx
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=10.0) as client:
+        return await run(client, records, args)
+
+
+def print_report(report: dict):
+    latency = report["request_latency"]
+    print(f"回放完成: {report['ticks']} 个 tick，用时 {report['elapsed_s']} 秒，"
+          f"{report['ticks_per_s']} tick/s，错误 {report['errors']}")
+    if latency.get("count"):
+        print(f"GSI 请求延迟: p50 {latency['p50_ms']} ms  p95 {latency['p95_ms']} ms  "
+              f"p99 {latency['p99_ms']} ms  max {latency['max_ms']} ms")
+    gsi = report["gsi"]
+    print(f"状态处理: 完整 {gsi['processed']}，跳过 {gsi['skipped']}，忽略 {gsi['ignored']}")
+
+    print("触发次数:")
+    for event_id, count in sorted(report["triggered"].items()):
+        print(f"  {event_id:<24} {count}")
+    commands = report["im_commands"]
+    print(f"指令: 提交 {commands['submitted']}，成功 {commands['succeeded']}，失败 {commands['failed']}，"
+          f"取代 {commands['superseded']}，丢弃 {commands['preempted']}")
+
+    if "stub_im" in report:
+        stub = report["stub_im"]
+        print(f"IM 测试服务: 请求 {stub['requests']}（批量 {stub['batch_requests']}，WebSocket {stub['ws_requests']}），"
+              f"指令 {stub['commands']}，"
+              f"失败 {stub['failures']}，最大并发 {stub['max_in_flight']}，"
+              f"延迟 p50 {stub['latency_ms']['p50']} ms / p99 {stub['latency_ms']['p99']} ms")
+
+    if report["stages"]:
+        print("服务端阶段延迟 (ms):")
+        print(f"  {'阶段':<14} {'次数':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+        for stage, s in report["stages"].items():
+            print(f"  {stage:<16} {s['count']:>8} {s['p50_ms']:>9} {s['p95_ms']:>9} "
+                  f"{s['p99_ms']:>9} {s['max_ms']:>9}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="GSI 录制回放与吞吐基准")
+    parser.add_argument("input", help="录制文件（JSON Lines，.gz 结尾时为 gzip 压缩）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示不等待（默认 1）")
+    parser.add_argument("--loops", type=int, default=1, help="重复回放次数")
+    parser.add_argument("--url", help="回放到运行中的后端，不指定时在进程内启动")
+    parser.add_argument("--im-url", help="进程内回放时使用的 IM 服务地址")
+    parser.add_argument("--im-transport", choices=("http", "ws"), help="进程内回放时发送指令的方式")
+    parser.add_argument("--stub", action="store_true", help="进程内回放时同时启动本地 IM 测试服务")
+    parser.add_argument("--stub-port", type=int, default=3101, help="本地 IM 测试服务端口")
+    parser.add_argument("--stub-latency", default="fixed:5", help="本地 IM 测试服务的延迟分布")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="本地 IM 测试服务的错误率")
+    parser.add_argument("--stub-concurrency", type=int, default=0, help="本地 IM 测试服务的并发上限")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="等待队列清空的最长时间（秒）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="进程内回放时不显示后端日志")
+    parser.add_argument("-o", "--output", help="把结果写入 JSON 文件，便于对比")
+    args = parser.parse_args(argv)
+    if args.stub and args.url:
+        parser.error("--stub 只能用于进程内回放")
+
+    records = read_records(args.input)
+    if not records:
+        parser.error("录制文件为空")
+    print(f"读取 {len(records)} 条记录，时长 {records[-1][0] - records[0][0]:.1f} 秒")
+
+    if args.url:
+        report = asyncio.run(run_over_http(records, args))
+    else:
+        report = asyncio.run(run_in_process(records, args))
+    report["speed"] = args.speed
+    report["mode"] = "http" if args.url else "in_process"
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+事件触发频率控制
+在 trigger_condition 中声明，按事件独立计时（使用单调时钟）:
+
+- cooldown: 触发后冷却时间（秒），冷却期内再次满足条件不会触发
+- debounce: 防抖窗口（秒），配合 debounce_mode:
+    - leading（默认）: 立即触发，之后持续满足条件时直到安静 debounce 秒才允许再次触发
+    - trailing: 持续满足条件时不触发，安静 debounce 秒后用最后一次的数据触发一次
+- max_rate: 令牌桶速率（次/秒）
+- burst: 令牌桶容量，即允许的突发次数（默认 1）
+
+未声明任何字段的事件直接放行
+"""
+
+import asyncio
+import math
+import time
+from typing import Any, Callable, Dict, Optional
+
+from structured_log import get_logger
+
+
+log = get_logger("scheduling")
+
+POLICY_KEYS = ("cooldown", "debounce", "debounce_mode", "max_rate", "burst")
+DEBOUNCE_MODES = ("leading", "trailing")
+
+
+class PolicyError(ValueError):
+    """频率控制参数无效"""
+
+
+def validate_policy(trigger: dict):
+    """检查 trigger_condition 中的频率控制参数，无效时抛出 PolicyError"""
+    for key in ("cooldown", "debounce", "max_rate", "burst"):
+        value = trigger.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or \
+                not math.isfinite(value) or value < 0:
+            raise PolicyError(f"{key} 必须是不小于 0 的数字")
+    mode = trigger.get("debounce_mode")
+    if mode is not None and mode not in DEBOUNCE_MODES:
+        raise PolicyError("debounce_mode 只能是 leading 或 trailing")
+
+
+class EventPolicy:
+    """单个事件的频率控制状态"""
+
+    __slots__ = ("params", "cooldown", "debounce", "trailing", "rate", "burst",
+                 "tokens", "refilled_at", "last_fired", "last_seen", "pending",
+                 "admitted", "suppressed")
+
+    def __init__(self, params: tuple):
+        cooldown, debounce, debounce_mode, max_rate, burst = params
+        self.params = params
+        self.cooldown = float(cooldown or 0)
+        self.debounce = float(debounce or 0)
+        self.trailing = debounce_mode == "trailing"
+        self.rate = float(max_rate or 0)
+        self.burst = max(1.0, float(burst or 1))
+        self.tokens = self.burst
+        self.refilled_at = 0.0
+        self.last_fired = float("-inf")
+        self.last_seen = float("-inf")
+        self.pending: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.suppressed = 0
+
+    def _take_token(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def admit(self, now: float) -> bool:
+        """冷却、leading 防抖和令牌桶检查，通过时记录一次触发"""
+        quiet = now - self.last_seen >= self.debounce
+        self.last_seen = now
+        if self.debounce and not self.trailing and not quiet:
+            return False
+        if now - self.last_fired < self.cooldown:
+            return False
+        if not self._take_token(now):
+            return False
+        self.last_fired = now
+        return True
+
+
+class EventScheduler:
+    """按事件应用频率控制，通过 emit 回调放行事件"""
+
+    def __init__(self, emit: Callable[[str, Any], None]):
+        self.emit = emit
+        self._policies: Dict[str, EventPolicy] = {}
+
+    def configure(self, event_configs: Dict[str, dict]):
+        """根据事件配置更新策略，参数未变化的事件保留计时状态"""
+        policies = {}
+        for event_id, config in event_configs.items():
+            trigger = config.get("trigger_condition", {})
+            params = tuple(trigger.get(key) for key in POLICY_KEYS)
+            if not any(params[:2]) and not params[3]:
+                continue
+            policy = self._policies.get(event_id)
+            if policy is None or policy.params != params:
+                # 配置文件中的无效参数只影响该事件（不做频率控制），不影响其他事件和新玩家
+                try:
+                    validate_policy(trigger)
+                except PolicyError as e:
+                    log.warning("✗ 事件的频率控制参数无效，已忽略", event_id=event_id, error=e)
+                    continue
+                if policy is not None and policy.pending is not None:
+                    policy.pending.cancel()
+                policy = EventPolicy(params)
+            policies[event_id] = policy
+
+        for event_id, policy in self._policies.items():
+            if event_id not in policies and policy.pending is not None:
+                policy.pending.cancel()
+        self._policies = policies
+
+    def offer(self, event_id: str, job: Any):
+        """事件满足触发条件时调用，由策略决定立即放行、延后放行或丢弃"""
+        policy = self._policies.get(event_id)
+        if policy is None:
+            self.emit(event_id, job)
+            return
+
+        now = time.monotonic()
+        if policy.trailing and policy.debounce:
+            policy.last_seen = now
+            if policy.pending is not None:
+                policy.pending.cancel()
+                policy.suppressed += 1
+            policy.pending = asyncio.get_running_loop().call_later(
+                policy.debounce, self._fire_trailing, event_id, policy, job)
+            return
+
+        if policy.admit(now):
+            policy.admitted += 1
+            self.emit(event_id, job)
+        else:
+            policy.suppressed += 1
+
+    def _fire_trailing(self, event_id: str, policy: EventPolicy, job: Any):
+        policy.pending = None
+        now = time.monotonic()
+        if now - policy.last_fired >= policy.cooldown and policy._take_token(now):
+            policy.last_fired = now
+            policy.admitted += 1
+            self.emit(event_id, job)
+        else:
+            policy.suppressed += 1
+
+    def close(self):
+        """取消尚未触发的 trailing 防抖"""
+        for policy in self._policies.values():
+            if policy.pending is not None:
+                policy.pending.cancel()
+                policy.pending = None
+
+    def stats(self) -> dict:
+        return {
+            event_id: {"admitted": policy.admitted, "suppressed": policy.suppressed}
+            for event_id, policy in self._policies.items()
+        }
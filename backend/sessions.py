@@ -0,0 +1,108 @@
+"""
+按 SteamID 区分的玩家会话
+多台电脑（或观战机位）向同一个后端发送 GSI 数据时，每个数据来源有独立的状态、指纹和触发频率控制，互不干扰
+
+会话按最近活动时间排序保存：访问时移到末尾，从头部淘汰空闲超时或超出数量上限的会话，均为 O(1)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional
+
+from game_state import GameState
+from scheduling import EventScheduler
+
+
+class PlayerSession:
+    """单个数据来源的状态"""
+
+    __slots__ = ("session_id", "state", "fingerprint", "scheduler", "created_at", "last_seen", "ticks")
+
+    def __init__(self, session_id: str, scheduler: EventScheduler):
+        self.session_id = session_id
+        self.state = GameState()
+        self.fingerprint: Optional[tuple] = None
+        self.scheduler = scheduler
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+        self.ticks = 0
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "session_id": self.session_id,
+            "state": self.state.to_dict(),
+            "ticks": self.ticks,
+            "idle_seconds": round(now - self.last_seen, 1),
+        }
+
+
+class SessionStore:
+    """有界会话表
+
+    max_sessions: 最多同时保存的会话数，超出时淘汰最久未活动的会话
+    idle_timeout: 超过该时间（秒）没有收到数据的会话被淘汰，0 表示不按时间淘汰
+    """
+
+    def __init__(self, scheduler_factory: Callable[[], EventScheduler], max_sessions: int = 16,
+                 idle_timeout: float = 300.0):
+        self.scheduler_factory = scheduler_factory
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self._sessions: "OrderedDict[str, PlayerSession]" = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[PlayerSession]:
+        return iter(tuple(self._sessions.values()))
+
+    def find(self, session_id: str) -> Optional[PlayerSession]:
+        return self._sessions.get(session_id)
+
+    def get(self, session_id: str) -> PlayerSession:
+        """取得会话并记录活动时间，不存在时创建"""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            self.sweep(now)
+            if len(self._sessions) >= self.max_sessions:
+                self._evict(next(iter(self._sessions)))
+            session = PlayerSession(session_id, self.scheduler_factory())
+            self._sessions[session_id] = session
+            self.created += 1
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_seen = now
+        session.ticks += 1
+        return session
+
+    def sweep(self, now: Optional[float] = None):
+        """淘汰空闲超时的会话"""
+        if now is None:
+            now = time.monotonic()
+        if self.idle_timeout <= 0:
+            return
+        deadline = now - self.idle_timeout
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_seen > deadline:
+                break
+            self._evict(oldest.session_id)
+
+    def _evict(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        session.scheduler.close()
+        self.evicted += 1
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "evicted": self.evicted,
+        }
+
+    def scheduler_stats(self) -> Dict[str, dict]:
+        return {session.session_id: session.scheduler.stats() for session in self._sessions.values()}
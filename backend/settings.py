@@ -0,0 +1,107 @@
+"""
+后端运行参数
+默认值可被项目根目录的 settings.json 覆盖（只需写出要修改的字段）
+"""
+
+import copy
+import json
+from pathlib import Path
+
+
+DEFAULT_SETTINGS = {
+    # Node.js IM 服务
+    "im": {
+        "url": "http://localhost:3001",
+        "transport": "http",            # http / ws（WebSocket 长连接，未连接时自动改走 HTTP）
+        "pool_size": 4,                 # keep-alive 连接池大小
+        "timeout": 5.0,                 # 单次请求超时（秒）
+        "batch": True,                  # 是否使用批量发送接口
+        "batch_window": 0.01,           # 指令合并窗口（秒）
+        "max_batch": 20,                # 单次批量请求最多指令数
+        "stale_after": 1.0,             # 低优先级指令等待超过该时间（秒）后可被高优先级指令抢占丢弃
+        "breaker_failures": 3,          # 连续失败多少次后熔断
+        "breaker_reset": 10.0,          # 熔断后多久（秒）放行一次试探请求
+        "max_retries": 2,               # 指令未送达时的最大重试次数
+        "retry_ratio": 0.2,             # 重试预算：每个请求可积累的重试次数
+        "probe_interval": 5.0           # /health 健康检查间隔（秒），0 表示关闭
+    },
+    # 玩家会话（按 SteamID 区分多台电脑发送的数据）
+    "sessions": {
+        "max_sessions": 16,             # 最多同时跟踪的玩家数，超出时淘汰最久未活动的
+        "idle_timeout": 300.0,          # 超过该时间（秒）无数据的玩家被淘汰，0 表示不按时间淘汰
+        "track_observed_players": False  # 是否也跟踪观战中的其他玩家（否则忽略非本地玩家的数据）
+    },
+    # 多进程模式
+    "cluster": {
+        "workers": 1,                   # uvicorn worker 进程数，大于 1 时必须配置 bus
+        "bus": "",                      # 进程间总线：空（进程内）/ redis://... / tcp://127.0.0.1:6390 / unix:///path
+        "embedded_broker": True         # bus 为 tcp:// 或 unix:// 时由 main_server.py 同时启动中转服务
+    },
+    # 事件分发队列
+    "dispatch": {
+        "queue_size": 256,              # 队列最大深度
+        "workers": 2,                   # 后台分发协程数量
+        "overflow_policy": "drop_oldest"  # drop_oldest / coalesce / reject
+    },
+    # 已触发事件的历史（/api/history）
+    "history": {
+        "capacity": 1000                # 最多保留的事件数，超出时覆盖最旧的
+    },
+    # 对局日志（状态变化、事件和指令结果写入分段的二进制文件，python journal.py export 导出）
+    "journal": {
+        "enabled": False,
+        "dir": "journal",               # 分段文件目录（相对项目根目录）
+        "max_bytes": 16777216,          # 单个分段超过该大小（字节）后轮转
+        "max_age": 3600.0,              # 单个分段超过该时长（秒）后轮转
+        "max_segments": 48,             # 最多保留的分段数，超出时删除最旧的，0 表示不删除
+        "queue_size": 100000,           # 等待写入的最大记录数，超出时丢弃
+        "flush_interval": 0.5           # 后台线程写入间隔（秒）
+    },
+    # /ws/game-state 推送
+    "state_push": {
+        "min_interval": 0.05,           # 最小推送间隔（秒），0 表示不限速
+        "heartbeat": 5.0                # 无变化时重发当前状态的间隔（秒）
+    },
+    # /ws/game-events 广播
+    "ws": {
+        "client_queue_size": 64         # 每个连接的发送队列长度，溢出时断开该连接
+    },
+    # 延迟统计（/api/metrics）
+    "metrics": {
+        "enabled": True
+    },
+    # 日志（后台线程写入，重复消息按窗口采样）
+    "logging": {
+        "level": "INFO",                # DEBUG / INFO / WARNING / ERROR
+        "file": "",                     # 日志文件（相对项目根目录），为空时只输出到控制台
+        "sample_interval": 1.0,         # 采样窗口（秒），0 表示不采样
+        "sample_burst": 5,              # 同一条消息每个窗口最多输出条数
+        "queue_size": 10000             # 待写入日志的最大条数，超出时丢弃
+    },
+    # event_configs.json 保存
+    "config_store": {
+        "save_delay": 0.5               # 合并写入窗口（秒）
+    },
+}
+
+
+def _merge(base: dict, override: dict) -> dict:
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def load_settings(path: Path) -> dict:
+    """读取 settings.json 并与默认值合并，文件不存在时使用默认值"""
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            _merge(settings, json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"读取 settings.json 失败，使用默认配置: {e}")
+    return settings
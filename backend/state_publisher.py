@@ -0,0 +1,119 @@
+"""
+游戏状态推送
+状态变化时由单个发布协程编码一次，所有 /ws/game-state 连接共享同一份帧数据
+
+增量协议（/ws/game-state?protocol=delta）:
+- 连接后先收到 {"type": "snapshot", "seq": n, "data": {...}}
+- 之后每次变化收到 {"type": "delta", "seq": n + 1, "changes": {字段: 新值}}
+- 无变化时定期收到 {"type": "heartbeat", "seq": n}
+- 客户端发现 seq 不连续时发送 "resync"（或 {"type": "resync"}）重新获取 snapshot
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+
+import json_codec
+
+
+_MISSING = object()
+
+
+class StatePublisher:
+    """变化驱动的状态发布器
+
+    min_interval: 两次推送之间的最小间隔（秒），间隔内的多次变化合并为一次
+    heartbeat: 无变化时重发最近一帧的间隔（秒）
+    """
+
+    def __init__(self, snapshot: Callable[[], dict], min_interval: float = 0.05,
+                 heartbeat: float = 5.0):
+        self.snapshot = snapshot
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.version = 0
+        self.frame = ""
+        # 增量协议的帧：当前快照、相对上一版本的增量、心跳
+        self.snapshot_frame = ""
+        self.delta_frame = ""
+        self.heartbeat_frame = ""
+        self.published = 0
+        self._data: dict = {}
+        self._dirty: Optional[asyncio.Event] = None
+        self._next: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动发布协程"""
+        if self._task is not None:
+            return
+        self._dirty = asyncio.Event()
+        self._next = asyncio.get_running_loop().create_future()
+        self._publish()
+        self._task = asyncio.create_task(self._run(), name="state-publisher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self):
+        """标记状态已变化"""
+        if self._dirty is not None:
+            self._dirty.set()
+
+    def _publish(self):
+        data = self.snapshot()
+        previous = self._data
+        changes = {k: v for k, v in data.items() if previous.get(k, _MISSING) != v}
+        self._data = data
+        self.version += 1
+        self.published += 1
+        timestamp = time.time()
+
+        dumps = json_codec.dumps
+        self.frame = dumps({
+            "type": "game_state",
+            "data": data,
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat()
+        })
+        self.snapshot_frame = dumps({
+            "type": "snapshot", "seq": self.version, "data": data, "ts": int(timestamp * 1000)
+        })
+        self.delta_frame = dumps({
+            "type": "delta", "seq": self.version, "changes": changes, "ts": int(timestamp * 1000)
+        })
+        self.heartbeat_frame = dumps({"type": "heartbeat", "seq": self.version})
+
+        waiters = self._next
+        self._next = asyncio.get_running_loop().create_future()
+        if not waiters.done():
+            waiters.set_result(None)
+
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            self._publish()
+            if self.min_interval > 0:
+                await asyncio.sleep(self.min_interval)
+
+    async def wait(self, last_version: int, wake: Optional[asyncio.Event] = None):
+        """等待版本号超过 last_version、wake 被置位或心跳超时"""
+        if self.version != last_version or (wake is not None and wake.is_set()):
+            return
+        waiters = [asyncio.shield(self._next)]
+        if wake is not None:
+            waiters.append(asyncio.ensure_future(wake.wait()))
+        try:
+            await asyncio.wait(waiters, timeout=self.heartbeat, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def next_frame(self, last_version: int) -> Tuple[int, str]:
+        """等待比 last_version 新的帧；超过心跳间隔无变化时返回当前帧"""
+        await self.wait(last_version)
+        return self.version, self.frame
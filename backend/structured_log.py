@@ -0,0 +1,171 @@
+"""
+异步结构化日志
+热路径只把日志记录放入内存队列，由后台线程格式化并写入控制台/文件，避免 Windows 控制台的同步输出拖慢 GSI 处理；
+同一条消息在短时间内重复出现时只输出前几条，其余计数后在下一条中汇总
+
+用法:
+    log = get_logger("commands")
+    log.info("✓ 指令发送成功", command="shock_1", latency_ms=12.5)
+    # 12:00:01 INFO  ✓ 指令发送成功 command=shock_1 latency_ms=12.5
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Dict, List, Optional
+
+
+ROOT_LOGGER = "cs2ycy"
+
+# logging 自身使用的关键字参数，其余关键字参数作为结构化字段
+_LOGGING_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """把关键字参数作为结构化字段附加到日志记录上"""
+
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, {})
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if fields:
+            kwargs["extra"] = {"fields": fields}
+        return msg, kwargs
+
+
+class SamplingFilter(logging.Filter):
+    """同一 logger 的同一条消息每 interval 秒最多放行 burst 条
+
+    被省略的条数记录在下一条放行的日志的 suppressed 字段中
+    """
+
+    def __init__(self, interval: float = 1.0, burst: int = 5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (logger, 消息) -> [窗口开始时间, 窗口内条数, 省略条数]
+        self._windows: Dict[tuple, list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = record.created
+        window = self._windows.get(key)
+        if window is None:
+            self._windows[key] = [now, 1, 0]
+            return True
+
+        if now - window[0] >= self.interval:
+            window[0] = now
+            window[1] = 0
+        if window[1] >= self.burst:
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+        window[1] += 1
+        if window[2]:
+            fields = getattr(record, "fields", None)
+            record.fields = dict(fields or {}, suppressed=window[2])
+            window[2] = 0
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """不在调用线程格式化，队列满时丢弃并计数"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 记录只在进程内传递，格式化留给后台线程
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """消息后附加 key=value 形式的结构化字段"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-5s %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+_handler: Optional[_QueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_sampler: Optional[SamplingFilter] = None
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
+
+
+def setup_logging(level: str = "INFO", file: Optional[str] = None, sample_interval: float = 1.0,
+                  sample_burst: int = 5, queue_size: int = 10000):
+    """配置日志输出并启动后台写入线程（重复调用时先停止之前的线程）"""
+    global _handler, _listener, _sampler
+
+    shutdown_logging()
+
+    formatter = StructuredFormatter()
+    handlers: List[logging.Handler] = []
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(formatter)
+    handlers.append(console)
+    if file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            file, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue(max(1, queue_size))
+    _sampler = SamplingFilter(sample_interval, sample_burst)
+    _handler = _QueueHandler(log_queue)
+    _handler.addFilter(_sampler)
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers = [_handler]
+    root.setLevel(level.upper())
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def log_stats() -> dict:
+    return {
+        "level": logging.getLevelName(logging.getLogger(ROOT_LOGGER).level),
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "suppressed": _sampler.suppressed if _sampler else 0,
+    }
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,325 @@
+"""
+本地 IM 测试服务
+实现与 im-service/server.js 相同的 /health、/api/status、/api/send-command、/api/send-commands 接口
+以及 /ws/commands WebSocket 通道，
+不连接腾讯 IM，而是按配置的延迟分布和错误率模拟发送结果，
+用于离线压测、基准测试（replay_gsi.py --stub）以及 backend/tests 中的 IM 客户端测试
+
+用法:
+    python stub_im_service.py                                  # 监听 3001 端口，固定 5ms 延迟
+    python stub_im_service.py --latency lognormal:20,0.6 --error-rate 0.05
+    python stub_im_service.py --port 3101 --concurrency 1 --no-batch --no-ws
+
+延迟分布（单位毫秒）:
+    fixed:5            固定 5ms
+    uniform:2,20       2~20ms 均匀分布
+    normal:10,3        均值 10ms、标准差 3ms（小于 0 时取 0）
+    lognormal:10,0.5   中位数 10ms、对数标准差 0.5（长尾）
+
+运行中可通过 POST /stub/config 修改 latency / error_rate / ready，GET /stub/stats 查看统计
+"""
+
+import argparse
+import asyncio
+import math
+import random
+from typing import Callable, List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+import json_codec
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """把延迟分布描述解析为返回秒数的采样函数"""
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(v) for v in params.split(",")] if params else []
+        if kind == "fixed":
+            ms = values[0] if values else 0.0
+            return lambda: ms / 1000
+        if kind == "uniform":
+            low, high = values
+            return lambda: random.uniform(low, high) / 1000
+        if kind == "normal":
+            mean, stddev = values
+            return lambda: max(0.0, random.gauss(mean, stddev)) / 1000
+        if kind == "lognormal":
+            median, sigma = values
+            mu = math.log(median)
+            return lambda: random.lognormvariate(mu, sigma) / 1000
+    except (ValueError, IndexError):
+        pass
+    raise ValueError(f"无法解析延迟分布: {spec}")
+
+
+class StubIMService:
+    """模拟 IM 服务
+
+    latency: 单条指令的发送延迟分布（见模块说明）
+    error_rate: 单条指令发送失败的概率
+    batch: 是否提供 /api/send-commands（为 False 时模拟旧版本 IM 服务）
+    ws: 是否提供 /ws/commands WebSocket 通道
+    concurrency: 同时发送的指令数上限，0 表示不限制（用于模拟下游限速造成的排队）
+    """
+
+    def __init__(self, latency: str = "fixed:5", error_rate: float = 0.0, batch: bool = True,
+                 concurrency: int = 0, ready: bool = True, ws: bool = True):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.batch = batch
+        self.ws = ws
+        self.ready = ready
+        self.concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[web.AppRunner] = None
+
+        self.requests = 0
+        self.batch_requests = 0
+        self.commands = 0
+        self.failures = 0
+        self.rejected = 0
+        self.ws_connections = 0
+        self.ws_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latencies: List[float] = []
+        self.command_counts: dict = {}
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/api/status", self.handle_status)
+        app.router.add_post("/api/send-command", self.handle_send_command)
+        if self.batch:
+            app.router.add_post("/api/send-commands", self.handle_send_commands)
+        if self.ws:
+            app.router.add_get("/ws/commands", self.handle_ws)
+        app.router.add_get("/stub/stats", self.handle_stats)
+        app.router.add_post("/stub/config", self.handle_config)
+        app.router.add_post("/stub/reset", self.handle_reset)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 3001):
+        """在当前事件循环中启动（供基准测试在进程内使用）"""
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def send(self, command_id: str) -> dict:
+        """模拟发送一条指令"""
+        self.commands += 1
+        self.command_counts[command_id] = self.command_counts.get(command_id, 0) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.concurrency > 0:
+                if self._semaphore is None:
+                    self._semaphore = asyncio.Semaphore(self.concurrency)
+                async with self._semaphore:
+                    latency = await self._wait()
+            else:
+                latency = await self._wait()
+        finally:
+            self.in_flight -= 1
+        self.latencies.append(latency)
+
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            self.failures += 1
+            return {"success": False, "message": "模拟发送失败"}
+        return {"success": True, "message": "指令发送成功"}
+
+    async def _wait(self) -> float:
+        latency = self.sample_latency()
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return latency
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "imReady": self.ready, "uid": "stub", "userId": "stub"})
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "isReady": self.ready,
+            "config": {"uid": "stub", "userId": "stub", "appId": 0, "hasToken": True, "hasSign": True},
+        })
+
+    async def send_command(self, body: dict) -> Tuple[int, dict]:
+        """处理单条发送请求，返回 (状态码, 响应体)"""
+        command_id = body.get("commandId")
+        if not command_id:
+            return 400, {"success": False, "message": "缺少 commandId 参数"}
+        if not self.ready:
+            self.rejected += 1
+            return 503, {"success": False, "message": "IM 未就绪"}
+
+        result = await self.send(command_id)
+        # 与 server.js 一致：单条发送失败时返回 500
+        return (200 if result["success"] else 500), result
+
+    async def send_commands(self, body: dict) -> Tuple[int, dict]:
+        """处理批量发送请求，返回 (状态码, 响应体)"""
+        self.batch_requests += 1
+        commands = body.get("commands")
+        if not isinstance(commands, list) or not commands:
+            return 400, {"success": False, "message": "缺少 commands 参数"}
+        if not self.ready:
+            self.rejected += len(commands)
+            return 503, {
+                "success": False,
+                "message": "IM 未就绪",
+                "results": [{"success": False, "message": "IM 未就绪"} for _ in commands],
+            }
+
+        # 与 server.js 一致：按顺序逐条发送
+        results = []
+        for command in commands:
+            command_id = command.get("commandId") if isinstance(command, dict) else None
+            if not command_id:
+                results.append({"success": False, "message": "缺少 commandId 参数"})
+                continue
+            results.append(await self.send(command_id))
+        return 200, {"success": all(r["success"] for r in results), "results": results}
+
+    async def handle_send_command(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        status, result = await self.send_command(await request.json())
+        return web.json_response(result, status=status)
+
+    async def handle_send_commands(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        status, result = await self.send_commands(await request.json())
+        return web.json_response(result, status=status)
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        """WebSocket 通道：每帧一个请求，响应按 id 对应，多个请求并发处理"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.ws_connections += 1
+        handlers = {"/api/send-command": self.send_command}
+        if self.batch:
+            handlers["/api/send-commands"] = self.send_commands
+
+        async def reply(frame: dict):
+            handler = handlers.get(frame.get("path"))
+            if handler is None:
+                status, result = 404, {"success": False, "message": "未知接口"}
+            else:
+                status, result = await handler(frame.get("body") or {})
+            if not ws.closed:
+                await ws.send_str(json_codec.dumps({"id": frame.get("id"), "status": status, "body": result}))
+
+        tasks = set()
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                self.requests += 1
+                self.ws_requests += 1
+                task = asyncio.ensure_future(reply(json_codec.loads(message.data)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            self.ws_connections -= 1
+            for task in tasks:
+                task.cancel()
+        return ws
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def handle_config(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        try:
+            if "latency" in body:
+                self.sample_latency = parse_latency(body["latency"])
+                self.latency_spec = body["latency"]
+        except ValueError as e:
+            return web.json_response({"success": False, "message": str(e)}, status=400)
+        if "error_rate" in body:
+            self.error_rate = float(body["error_rate"])
+        if "ready" in body:
+            self.ready = bool(body["ready"])
+        return web.json_response({"success": True, "config": self.config()})
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"success": True})
+
+    def config(self) -> dict:
+        return {
+            "latency": self.latency_spec,
+            "error_rate": self.error_rate,
+            "ready": self.ready,
+            "batch": self.batch,
+            "ws": self.ws,
+            "concurrency": self.concurrency,
+        }
+
+    def reset(self):
+        self.requests = 0
+        self.batch_requests = 0
+        self.commands = 0
+        self.failures = 0
+        self.rejected = 0
+        self.ws_requests = 0
+        self.max_in_flight = self.in_flight
+        self.latencies = []
+        self.command_counts = {}
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def quantile(q: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 3)
+
+        return {
+            "config": self.config(),
+            "requests": self.requests,
+            "batch_requests": self.batch_requests,
+            "commands": self.commands,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "ws_connections": self.ws_connections,
+            "ws_requests": self.ws_requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "latency_ms": {"p50": quantile(0.5), "p95": quantile(0.95), "p99": quantile(0.99)},
+            "command_counts": self.command_counts,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 IM 测试服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--latency", default="fixed:5", help="发送延迟分布，如 fixed:5、lognormal:10,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="发送失败概率（0~1）")
+    parser.add_argument("--concurrency", type=int, default=0, help="同时发送的指令数上限，0 表示不限制")
+    parser.add_argument("--no-batch", action="store_true", help="不提供批量接口，模拟旧版本 IM 服务")
+    parser.add_argument("--no-ws", action="store_true", help="不提供 WebSocket 通道")
+    parser.add_argument("--not-ready", action="store_true", help="启动时 IM 未就绪（发送返回 503）")
+    args = parser.parse_args()
+
+    service = StubIMService(latency=args.latency, error_rate=args.error_rate, batch=not args.no_batch,
+                            concurrency=args.concurrency, ready=not args.not_ready, ws=not args.no_ws)
+    print("=" * 60)
+    print("本地 IM 测试服务")
+    print(f"HTTP 服务: http://{args.host}:{args.port}")
+    print(f"延迟分布: {args.latency}，错误率: {args.error_rate}，批量接口: {'否' if args.no_batch else '是'}，"
+          f"WebSocket 通道: {'否' if args.no_ws else '是'}")
+    print(f"统计: http://{args.host}:{args.port}/stub/stats")
+    print("=" * 60)
+    web.run_app(service.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
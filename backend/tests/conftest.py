@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 后端模块以脚本方式互相导入（from metrics import ...），测试时把 backend 目录加入搜索路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,104 @@
+import asyncio
+import socket
+
+from circuit_breaker import CircuitBreaker
+from command_batcher import CommandBatcher
+from im_client import IMClient, IMUnavailable
+from stub_im_service import StubIMService
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_with_stub(scenario, **stub_options):
+    """在进程内启动本地 IM 测试服务，把 (stub, client) 交给 scenario 执行"""
+    async def main():
+        port = free_port()
+        stub = StubIMService(latency="fixed:0", **stub_options)
+        await stub.start(port=port)
+        client = IMClient(f"http://127.0.0.1:{port}", probe_interval=0, max_retries=0,
+                          breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        try:
+            await client.start()
+            await scenario(stub, client)
+        finally:
+            await client.close()
+            await stub.stop()
+
+    asyncio.run(main())
+
+
+def test_breaker_opens_then_half_opens_on_probe_and_closes():
+    async def scenario(stub, client):
+        stub.ready = False
+        for _ in range(2):
+            result = await client.send_command("fire")
+            assert not result["success"]
+        assert client.breaker.state == CircuitBreaker.OPEN
+
+        # 熔断期间不再请求 IM 服务
+        requests = stub.requests
+        try:
+            await client.send_command("fire")
+        except IMUnavailable:
+            pass
+        else:
+            raise AssertionError("熔断中的请求应被拒绝")
+        assert stub.requests == requests
+
+        # IM 未就绪时健康检查不会解除熔断
+        assert not await client.probe()
+        assert client.breaker.state == CircuitBreaker.OPEN
+
+        stub.ready = True
+        assert await client.probe()
+        assert client.breaker.state == CircuitBreaker.HALF_OPEN
+
+        result = await client.send_command("fire")
+        assert result["success"]
+        assert client.breaker.state == CircuitBreaker.CLOSED
+
+    run_with_stub(scenario)
+
+
+def test_batch_endpoint_404_falls_back_to_single_sends():
+    async def scenario(stub, client):
+        batcher = CommandBatcher(client, window=0.01)
+        futures = [batcher.submit(command_id) for command_id in ("a", "b", "c")]
+        batcher.start()
+        try:
+            results = await asyncio.gather(*futures)
+        finally:
+            await batcher.stop()
+
+        assert all(result["success"] for result in results)
+        assert not batcher.batch_supported
+        assert batcher.single_sends == 3
+        assert stub.batch_requests == 0
+        assert stub.command_counts == {"a": 1, "b": 1, "c": 1}
+
+    run_with_stub(scenario, batch=False)
+
+
+def test_supersession_is_scoped_to_session():
+    async def scenario(stub, client):
+        batcher = CommandBatcher(client, window=0.01)
+        first = batcher.submit("fire", session_id="player-a")
+        second = batcher.submit("fire", session_id="player-a")
+        other = batcher.submit("fire", session_id="player-b")
+        batcher.start()
+        try:
+            results = await asyncio.gather(first, second, other)
+        finally:
+            await batcher.stop()
+
+        assert results[0]["dropped"] and results[0]["reason"] == "superseded"
+        assert results[1]["success"] and results[2]["success"]
+        assert batcher.superseded == 1
+        assert stub.batch_requests == 1
+        assert stub.command_counts == {"fire": 2}
+
+    run_with_stub(scenario)
@@ -0,0 +1,35 @@
+from metrics import Histogram, Metrics
+
+
+def test_quantiles_resolve_microsecond_stages():
+    """几微秒的阶段（parse / diff / trigger）的分位数不应挤在同一个桶里"""
+    histogram = Histogram()
+    for _ in range(990):
+        histogram.observe(5e-6)
+    for _ in range(10):
+        histogram.observe(40e-6)
+
+    p50 = histogram.quantile(0.5)
+    p99 = histogram.quantile(0.99)
+    assert 3e-6 <= p50 <= 6e-6
+    assert p99 < 10e-6
+    assert histogram.quantile(0.999) > 20e-6
+    assert p50 * 4 < histogram.max
+
+
+def test_quantiles_on_skewed_millisecond_distribution():
+    histogram = Histogram()
+    for _ in range(950):
+        histogram.observe(0.002)
+    for _ in range(50):
+        histogram.observe(0.2)
+
+    assert histogram.quantile(0.5) < 0.003
+    assert histogram.quantile(0.99) > 0.1
+    assert histogram.quantile(0.99) <= histogram.max
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.observe("parse", 1e-5)
+    assert metrics.to_dict()["stages"] == {}
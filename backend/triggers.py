@@ -0,0 +1,232 @@
+"""
+触发条件引擎
+事件配置在加载/修改时编译成谓词对象，并按依赖的状态字段建立索引，
+每个 GSI tick 只计算受变化字段影响的触发条件
+谓词的 old/new 参数为 GameState 快照；type 为 expression 时条件由表达式给出（见 expressions.py）
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from expressions import ExpressionError, compile_expression
+
+
+class Trigger:
+    """触发谓词基类
+
+    fields: 依赖的状态字段
+    level: 为 True 时只要条件成立每个 tick 都触发（不依赖字段变化）
+    match_value: 不为 None 时只有新值等于它才可能触发，用于按值建立索引
+    """
+
+    __slots__ = ()
+    fields: Tuple[str, ...] = ()
+    level = False
+    match_value = None
+
+    def __call__(self, old, new) -> bool:
+        raise NotImplementedError
+
+
+class HealthDecrease(Trigger):
+    """血量减少至少 min_damage"""
+
+    __slots__ = ("min_damage",)
+    fields = ("health",)
+
+    def __init__(self, min_damage: int = 1):
+        self.min_damage = min_damage
+
+    def __call__(self, old, new):
+        damage = old.health - new.health
+        return damage > 0 and damage >= self.min_damage
+
+
+class HealthZero(Trigger):
+    """血量从大于 0 变为 0"""
+
+    __slots__ = ()
+    fields = ("health",)
+
+    def __call__(self, old, new):
+        return new.health == 0 and old.health > 0
+
+
+class CrossAbove(Trigger):
+    """字段从低于 min_value 变为不低于 min_value（闪光、烟雾）"""
+
+    __slots__ = ("field", "min_value", "fields")
+
+    def __init__(self, field: str, min_value: int = 1):
+        self.field = field
+        self.min_value = min_value
+        self.fields = (field,)
+
+    def __call__(self, old, new):
+        return getattr(new, self.field) >= self.min_value > getattr(old, self.field)
+
+
+class AtLeast(Trigger):
+    """字段不低于 min_value 时每个 tick 都触发（燃烧）"""
+
+    __slots__ = ("field", "min_value", "fields")
+    level = True
+
+    def __init__(self, field: str, min_value: int = 1):
+        self.field = field
+        self.min_value = min_value
+        self.fields = (field,)
+
+    def __call__(self, old, new):
+        return getattr(new, self.field) >= self.min_value
+
+
+class PhaseEnter(Trigger):
+    """阶段字段切换到目标值"""
+
+    __slots__ = ("field", "value", "fields", "match_value")
+
+    def __init__(self, field: str, value):
+        self.field = field
+        self.value = value
+        self.fields = (field,)
+        self.match_value = value
+
+    def __call__(self, old, new):
+        return getattr(new, self.field) == self.value and getattr(old, self.field) != self.value
+
+
+class Expression(Trigger):
+    """表达式条件，默认在引用的字段变化时计算；level 为 True 时每个 tick 都计算"""
+
+    __slots__ = ("source", "function", "fields", "level", "errors")
+
+    def __init__(self, source: str, level: bool = False):
+        compiled = compile_expression(source)
+        self.source = source
+        self.function = compiled.function
+        self.fields = tuple(sorted(compiled.fields))
+        self.level = level
+        self.errors = 0
+
+    def __call__(self, old, new):
+        try:
+            return bool(self.function(old, new))
+        except (ArithmeticError, TypeError):
+            # 除零等运行时错误按不满足处理
+            self.errors += 1
+            return False
+
+
+class TriggerError(ValueError):
+    """trigger_condition 无效"""
+
+
+# 由武器和比赛统计推导出的事件类型，用等价的表达式实现（只在相关字段变化时计算）
+DERIVED_TRIGGERS = {
+    # 本回合击杀数 / 爆头击杀数增加（新回合清零时不会触发）
+    "kill": "round_kills > old.round_kills",
+    "headshot": "round_killhs > old.round_killhs",
+    "mvp": "mvps > old.mvps",
+    # 同一把武器的弹匣从有子弹变为 0
+    "ammo_empty": "ammo_clip == 0 and old.ammo_clip > 0 and weapon == old.weapon",
+    # 切换手中的武器（死亡时武器列表清空，不算切换）
+    "weapon_switch": "weapon != old.weapon and weapon != '' and old.weapon != ''",
+    "reload": "reloading and not old.reloading",
+}
+
+
+def compile_trigger(trigger: dict) -> Optional[Trigger]:
+    """把 trigger_condition 编译为谓词，未知类型返回 None，表达式无效时抛出 TriggerError"""
+    trigger_type = trigger.get("type")
+
+    if trigger_type == "health_decrease":
+        return HealthDecrease(trigger.get("min_damage", 1))
+    if trigger_type == "health_zero":
+        return HealthZero()
+    if trigger_type in ("flashed", "smoked"):
+        return CrossAbove(trigger_type, trigger.get("min_value", 1))
+    if trigger_type == "burning":
+        return AtLeast("burning", trigger.get("min_value", 1))
+    if trigger_type == "round_phase":
+        return PhaseEnter("round_phase", trigger.get("value"))
+    if trigger_type in DERIVED_TRIGGERS:
+        return Expression(DERIVED_TRIGGERS[trigger_type])
+    if trigger_type == "expression":
+        try:
+            return Expression(trigger.get("expr", ""), bool(trigger.get("level", False)))
+        except ExpressionError as e:
+            raise TriggerError(f"触发条件表达式无效: {e}")
+    return None
+
+
+class TriggerEngine:
+    """按字段索引的已编译触发器集合"""
+
+    def __init__(self):
+        # 字段 -> [(顺序, event_id, 谓词, 配置)]
+        self._by_field: Dict[str, List[tuple]] = {}
+        # (字段, 值) -> [...]，用于 round_phase 等等值条件
+        self._by_value: Dict[tuple, List[tuple]] = {}
+        self._level: List[tuple] = []
+        self.count = 0
+        self.has_level_triggers = False
+        # event_id -> 编译失败的原因
+        self.errors: Dict[str, str] = {}
+
+    def compile(self, event_configs: Dict[str, dict]):
+        """根据事件配置重新编译（配置加载或修改后调用）"""
+        by_field: Dict[str, List[tuple]] = {}
+        by_value: Dict[tuple, List[tuple]] = {}
+        level: List[tuple] = []
+        count = 0
+        errors: Dict[str, str] = {}
+
+        for order, (event_id, config) in enumerate(event_configs.items()):
+            if not config.get("enabled", False):
+                continue
+            try:
+                predicate = compile_trigger(config.get("trigger_condition", {}))
+            except TriggerError as e:
+                errors[event_id] = str(e)
+                continue
+            if predicate is None:
+                continue
+
+            entry = (order, event_id, predicate, config)
+            count += 1
+            if predicate.level:
+                level.append(entry)
+            elif predicate.match_value is not None:
+                for field in predicate.fields:
+                    by_value.setdefault((field, predicate.match_value), []).append(entry)
+            else:
+                for field in predicate.fields:
+                    by_field.setdefault(field, []).append(entry)
+
+        # 一次性替换，避免评估过程中看到半编译的状态
+        self._by_field = by_field
+        self._by_value = by_value
+        self._level = level
+        self.count = count
+        self.has_level_triggers = bool(level)
+        self.errors = errors
+
+    def evaluate(self, old, new, changed: Iterable[str]) -> List[Tuple[str, dict]]:
+        """返回本 tick 触发的 (event_id, config)，按配置顺序排列"""
+        by_field = self._by_field
+        by_value = self._by_value
+        matched = {}
+
+        for field in changed:
+            for entries in (by_field.get(field), by_value.get((field, getattr(new, field, None)))):
+                if not entries:
+                    continue
+                for entry in entries:
+                    if entry[0] not in matched and entry[2](old, new):
+                        matched[entry[0]] = entry
+
+        for entry in self._level:
+            if entry[0] not in matched and entry[2](old, new):
+                matched[entry[0]] = entry
+
+        return [(matched[order][1], matched[order][3]) for order in sorted(matched)]
@@ -0,0 +1,108 @@
+"""
+WebSocket 广播
+每个连接有独立的有界发送队列和发送协程，广播只编码一次后放入各队列；
+队列溢出的慢客户端会被断开，避免拖慢其他连接
+"""
+
+import asyncio
+import time
+from typing import Optional, Set
+
+from fastapi import WebSocket
+
+from metrics import metrics
+from structured_log import get_logger
+
+
+log = get_logger("ws")
+
+
+class Subscriber:
+    """单个 WebSocket 连接及其发送队列"""
+
+    __slots__ = ("websocket", "queue", "task")
+
+    def __init__(self, websocket: WebSocket, maxsize: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.task: Optional[asyncio.Task] = None
+
+
+class Broadcaster:
+    """WebSocket 连接注册表与广播"""
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+        self.sent = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def add(self, websocket: WebSocket) -> Subscriber:
+        """注册已 accept 的连接并启动发送协程"""
+        sub = Subscriber(websocket, self.queue_size)
+        sub.task = asyncio.create_task(self._drain(sub))
+        self.subscribers.add(sub)
+        return sub
+
+    def remove(self, sub: Subscriber):
+        """注销连接（可重复调用）"""
+        self.subscribers.discard(sub)
+        if sub.task is not None and sub.task is not asyncio.current_task():
+            sub.task.cancel()
+
+    def send(self, sub: Subscriber, frame: str) -> bool:
+        """向单个连接排队发送，队列满时断开该连接"""
+        try:
+            sub.queue.put_nowait((frame, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            self._evict(sub, f"发送队列已满 ({self.queue_size})")
+            return False
+
+    def broadcast(self, frame: str) -> int:
+        """向所有连接排队发送同一帧，返回成功入队的连接数"""
+        delivered = 0
+        for sub in tuple(self.subscribers):
+            if self.send(sub, frame):
+                delivered += 1
+        return delivered
+
+    def _evict(self, sub: Subscriber, reason: str):
+        if sub not in self.subscribers:
+            return
+        self.evicted += 1
+        self.remove(sub)
+        log.warning("✗ 断开慢速 WebSocket 客户端", reason=reason, connections=len(self.subscribers))
+        asyncio.create_task(self._close(sub.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def _drain(self, sub: Subscriber):
+        try:
+            while True:
+                frame, queued_at = await sub.queue.get()
+                await sub.websocket.send_text(frame)
+                self.sent += 1
+                metrics.observe("ws_send_delay", time.perf_counter() - queued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if sub in self.subscribers:
+                log.warning("发送事件通知失败", error=e)
+                self.remove(sub)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.subscribers),
+            "queue_size": self.queue_size,
+            "sent": self.sent,
+            "evicted": self.evicted,
+        }
@@ -62,6 +62,14 @@ export const gameAPI = {
   }
 }
 
+// 事件历史API
+export const historyAPI = {
+  // 获取已触发的事件，params: { cursor, since, event_id, limit }
+  getHistory(params) {
+    return api.get('/history', { params })
+  }
+}
+
 // YCY IM 配置API
 export const imAPI = {
   // 获取 IM 配置
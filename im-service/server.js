@@ -1,6 +1,7 @@
 import TencentCloudChat from '@tencentcloud/chat';
 import express from 'express';
 import cors from 'cors';
+import { WebSocketServer } from 'ws';
 import { promises as fs } from 'fs';
 import path from 'path';
 import { fileURLToPath } from 'url';
@@ -285,36 +286,126 @@ app.get('/api/status', (req, res) => {
   });
 });
 
-// 发送指令
-app.post('/api/send-command', async (req, res) => {
-  try {
-    const { commandId } = req.body;
+// 发送单条指令，返回 { status, body }（HTTP 接口与 WebSocket 通道共用）
+async function handleSendCommand(body) {
+  const commandId = body && body.commandId;
 
-    if (!commandId) {
-      return res.status(400).json({
-        success: false,
-        message: '缺少 commandId 参数'
-      });
-    }
+  if (!commandId) {
+    return { status: 400, body: { success: false, message: '缺少 commandId 参数' } };
+  }
 
-    if (!isReady) {
-      return res.status(503).json({
-        success: false,
-        message: 'IM 未就绪'
-      });
-    }
+  if (!isReady) {
+    return { status: 503, body: { success: false, message: 'IM 未就绪' } };
+  }
 
+  try {
     const result = await sendIMMessage(commandId);
-    res.json(result);
+    return { status: 200, body: result };
   } catch (error) {
     log('ERROR', 'API 错误:', error.message);
-    res.status(500).json({
-      success: false,
-      message: error.message
-    });
+    return { status: 500, body: { success: false, message: error.message } };
   }
+}
+
+// 批量发送指令（按顺序逐条发送，返回每条指令的结果）
+async function handleSendCommands(body) {
+  const commands = body && body.commands;
+
+  if (!Array.isArray(commands) || commands.length === 0) {
+    return { status: 400, body: { success: false, message: '缺少 commands 参数' } };
+  }
+
+  if (!isReady) {
+    return {
+      status: 503,
+      body: {
+        success: false,
+        message: 'IM 未就绪',
+        results: commands.map(() => ({ success: false, message: 'IM 未就绪' }))
+      }
+    };
+  }
+
+  const results = [];
+  for (const command of commands) {
+    const commandId = command && command.commandId;
+    if (!commandId) {
+      results.push({ success: false, message: '缺少 commandId 参数' });
+      continue;
+    }
+    try {
+      const result = await sendIMMessage(commandId);
+      results.push({ success: true, message: result.message });
+    } catch (error) {
+      results.push({ success: false, message: error.message });
+    }
+  }
+
+  return {
+    status: 200,
+    body: {
+      success: results.every(r => r.success),
+      results
+    }
+  };
+}
+
+// 发送指令
+app.post('/api/send-command', async (req, res) => {
+  const { status, body } = await handleSendCommand(req.body);
+  res.status(status).json(body);
+});
+
+// 批量发送指令
+app.post('/api/send-commands', async (req, res) => {
+  const { status, body } = await handleSendCommands(req.body);
+  res.status(status).json(body);
 });
 
+// WebSocket 指令通道：后端保持一条长连接，每条指令只需一帧
+// 请求 { id, path, body }，响应 { id, status, body }；多个请求并发处理，响应按 id 对应
+const wsRoutes = {
+  '/api/send-command': handleSendCommand,
+  '/api/send-commands': handleSendCommands
+};
+
+function attachCommandChannel(server) {
+  const wss = new WebSocketServer({ server, path: '/ws/commands' });
+
+  wss.on('connection', (socket) => {
+    log('INFO', '后端已连接 WebSocket 指令通道');
+
+    socket.on('message', async (data) => {
+      let frame;
+      try {
+        frame = JSON.parse(data.toString());
+      } catch (error) {
+        log('WARN', '无法解析 WebSocket 指令帧:', error.message);
+        return;
+      }
+
+      const handler = wsRoutes[frame.path];
+      const { status, body } = handler
+        ? await handler(frame.body)
+        : { status: 404, body: { success: false, message: '未知接口' } };
+
+      if (socket.readyState === socket.OPEN) {
+        socket.send(JSON.stringify({ id: frame.id, status, body }));
+      }
+    });
+
+    socket.on('close', () => {
+      log('INFO', 'WebSocket 指令通道已断开');
+    });
+
+    socket.on('error', (error) => {
+      log('WARN', 'WebSocket 指令通道错误:', error.message);
+    });
+  });
+
+  return wss;
+}
+
 // 重新初始化
 app.post('/api/reinit', async (req, res) => {
   try {
@@ -337,15 +428,17 @@ async function startServer() {
   // 初始化 IM
   await initIM();
 
-  // 启动 HTTP 服务器
-  app.listen(PORT, () => {
+  // 启动 HTTP 服务器（WebSocket 指令通道共用同一端口）
+  const server = app.listen(PORT, () => {
     log('INFO', '='.repeat(60));
     log('INFO', 'CS2 IM 服务已启动');
     log('INFO', `HTTP 服务: http://localhost:${PORT}`);
+    log('INFO', `指令通道: ws://localhost:${PORT}/ws/commands`);
     log('INFO', `健康检查: http://localhost:${PORT}/health`);
     log('INFO', `状态查询: http://localhost:${PORT}/api/status`);
     log('INFO', '='.repeat(60));
   });
+  attachCommandChannel(server);
 
   // 定期心跳
   setInterval(() => {
@@ -1,11 +1,19 @@
 """
 CS2 GSI 连接测试脚本
 用于测试 CS2 游戏是否正确发送数据到后端
+
+录制模式会把收到的 GSI 请求体连同到达时间写入文件，供 backend/replay_gsi.py 回放:
+    python test_cs2_connect.py --record match.jsonl.gz
+
+录制文件每行一条记录 {"t": 距录制开始的秒数, "body": 请求体}，文件名以 .gz 结尾时使用 gzip 压缩
 """
 
 from fastapi import FastAPI, Request
 import uvicorn
+import argparse
+import gzip
 import json
+import time
 from datetime import datetime
 
 app = FastAPI()
@@ -14,6 +22,23 @@ app = FastAPI()
 received_count = 0
 last_data = None
 
+# 录制文件（--record 时打开）
+record_file = None
+record_started_at = 0.0
+
+
+def open_record_file(path: str):
+    """打开录制文件，.gz 结尾时使用 gzip 压缩"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def record_payload(data: dict):
+    """追加一条录制记录（紧凑 JSON，一行一条）"""
+    record = {"t": round(time.perf_counter() - record_started_at, 6), "body": data}
+    record_file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
 @app.post("/api/cs2-event")
 async def test_cs2_event(request: Request):
     """测试接收 CS2 数据"""
@@ -23,6 +48,8 @@ async def test_cs2_event(request: Request):
         data = await request.json()
         received_count += 1
         last_data = data
+        if record_file is not None:
+            record_payload(data)
 
         # 打印关键信息
         print("\n" + "=" * 60)
@@ -92,13 +119,24 @@ async def status():
     }
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CS2 GSI 连接测试服务器")
+    parser.add_argument("--record", metavar="PATH", help="把收到的 GSI 数据录制到文件（.gz 结尾时压缩）")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    args = parser.parse_args()
+
+    if args.record:
+        record_file = open_record_file(args.record)
+        record_started_at = time.perf_counter()
+
     print("=" * 60)
     print("CS2 GSI 连接测试服务器")
     print("=" * 60)
     print()
-    print("服务器地址: http://localhost:8000")
-    print("测试端点: http://localhost:8000/api/cs2-event")
-    print("状态查询: http://localhost:8000/status")
+    print(f"服务器地址: http://localhost:{args.port}")
+    print(f"测试端点: http://localhost:{args.port}/api/cs2-event")
+    print(f"状态查询: http://localhost:{args.port}/status")
+    if args.record:
+        print(f"录制文件: {args.record}")
     print()
     print("=" * 60)
     print()
@@ -113,7 +151,10 @@ if __name__ == "__main__":
     print()
 
     try:
-        uvicorn.run(app, host="0.0.0.0", port=8000, log_level="warning")
+        uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="warning")
     except KeyboardInterrupt:
         print("\n\n服务器已停止")
+    finally:
+        if record_file is not None:
+            record_file.close()
         print(f"总共收到 {received_count} 条数据")